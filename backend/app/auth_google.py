@@ -1,7 +1,10 @@
 import json
+import logging
 import os
-from datetime import datetime
-from typing import Optional
+import threading
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional
 
 from cryptography.fernet import Fernet
 from fastapi import HTTPException
@@ -10,7 +13,15 @@ from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
 from sqlalchemy.orm import Session
 
-from .models import User
+from .db import SessionLocal
+from .gmail_client import invalidate_service
+from .metrics import credential_refresh_total, record_error
+from .models import Campaign, ScheduledSend, SendLog, Settings, User
+
+logger = logging.getLogger("mailer.credentials")
+
+REFRESH_MARGIN = timedelta(minutes=int(os.environ.get("CREDENTIAL_REFRESH_MARGIN_MIN", "5")))
+REFRESH_POLL_SECONDS = 60
 
 SCOPES = [
     "https://www.googleapis.com/auth/gmail.send",
@@ -25,6 +36,11 @@ def _fernet() -> Fernet:
     key = os.environ.get("ENCRYPTION_KEY")
     if not key:
         raise RuntimeError("ENCRYPTION_KEY env var required for token encryption")
+    return _fernet_for(key)
+
+
+@lru_cache(maxsize=4)
+def _fernet_for(key: str) -> Fernet:
     return Fernet(key.encode())
 
 
@@ -76,22 +92,138 @@ def exchange_code(db: Session, code: str) -> User:
         db.add(user)
     db.commit()
     db.refresh(user)
+    credential_manager.invalidate(user.id)
+    invalidate_service(user.email)
     return user
 
 
+def _decrypt(token_encrypted: str) -> Credentials:
+    data = json.loads(_fernet().decrypt(token_encrypted.encode()).decode())
+    return Credentials.from_authorized_user_info(data, scopes=SCOPES)
+
+
+class _Entry:
+    def __init__(self, token_encrypted: str, credentials: Credentials):
+        self.token_encrypted = token_encrypted
+        self.superseded: Optional[str] = None  # ciphertext replaced by our own write-back
+        self.credentials = credentials
+        self.lock = threading.Lock()
+
+
+class CredentialManager:
+    # Decrypted credentials per user, refreshed ahead of expiry by a background
+    # thread. Refreshed tokens are re-encrypted and written back to users.
+
+    def __init__(self, margin: timedelta = REFRESH_MARGIN):
+        self.margin = margin
+        self._entries: Dict[int, _Entry] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def get(self, user: User) -> Credentials:
+        with self._lock:
+            entry = self._entries.get(user.id)
+            if entry is None or user.token_encrypted not in (entry.token_encrypted, entry.superseded):
+                entry = self._entries[user.id] = _Entry(user.token_encrypted, _decrypt(user.token_encrypted))
+        if not entry.credentials.valid:
+            # Only when the background refresh has not kept up.
+            self._refresh(user.id, entry, force=True)
+        return entry.credentials
+
+    def invalidate(self, user_id: Optional[int] = None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def _needs_refresh(self, credentials: Credentials) -> bool:
+        if not credentials.refresh_token:
+            return False
+        if not credentials.token or credentials.expiry is None:
+            return True
+        return credentials.expiry - self.margin <= datetime.utcnow()
+
+    def _refresh(self, user_id: int, entry: _Entry, force: bool = False):
+        # Single-flight: whoever holds the entry lock refreshes, everyone else
+        # waits for it and then sees the new token instead of refreshing again.
+        with entry.lock:
+            credentials = entry.credentials
+            if not credentials.refresh_token:
+                return
+            if credentials.valid if force else not self._needs_refresh(credentials):
+                return
+            try:
+                credentials.refresh(Request())
+            except Exception:
+                credential_refresh_total.inc(result="error")
+                raise
+            credential_refresh_total.inc(result="ok")
+            encrypted = _fernet().encrypt(credentials.to_json().encode()).decode()
+            db = SessionLocal()
+            try:
+                user = db.get(User, user_id)
+                if user and user.token_encrypted == entry.token_encrypted:
+                    user.token_encrypted = encrypted
+                    db.commit()
+            finally:
+                db.close()
+            with self._lock:
+                entry.superseded = entry.token_encrypted
+                entry.token_encrypted = encrypted
+
+    def refresh_due(self):
+        with self._lock:
+            entries = list(self._entries.items())
+        for user_id, entry in entries:
+            try:
+                self._refresh(user_id, entry)
+            except Exception as exc:
+                record_error("credentials", exc)
+                logger.exception("credential refresh failed for user %s", user_id)
+
+    def start(self, poll_seconds: int = REFRESH_POLL_SECONDS):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.wait(poll_seconds):
+                self.refresh_due()
+
+        self._thread = threading.Thread(target=loop, name="credential-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+credential_manager = CredentialManager()
+
+
 def load_credentials(user: User) -> Credentials:
-    decrypted = _fernet().decrypt(user.token_encrypted.encode()).decode()
-    data = json.loads(decrypted)
-    cred = Credentials.from_authorized_user_info(data, scopes=SCOPES)
-    if cred and cred.expired and cred.refresh_token:
-        cred.refresh(Request())
-    return cred
+    return credential_manager.get(user)
 
 
 def disconnect(db: Session, user: User):
+    email = user.email
+    user_id = user.id
+    # Apply the foreign keys' ON DELETE rules here too: SQLite does not enforce
+    # them, and queued sends left on a deleted account would never be dispatched.
+    # With user_id NULL they belong to the default account's lane.
+    for model in (ScheduledSend, Campaign, SendLog):
+        db.query(model).filter(model.user_id == user_id).update({"user_id": None}, synchronize_session=False)
+    db.query(Settings).filter(Settings.user_id == user_id).delete(synchronize_session=False)
     db.delete(user)
     db.commit()
+    credential_manager.invalidate(user_id)
+    invalidate_service(email)
 
 
 def current_user(db: Session) -> Optional[User]:
-    return db.query(User).first()
+    return db.query(User).order_by(User.id).first()
+
+
+def list_accounts(db: Session) -> List[User]:
+    return db.query(User).order_by(User.id).all()
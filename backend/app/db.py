@@ -1,11 +1,189 @@
 import os
-from sqlalchemy import create_engine
+import threading
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeout
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool, StaticPool
 
 DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./mailer.db")
 
-connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
-engine = create_engine(DATABASE_URL, connect_args=connect_args)
+# The scheduler/dispatch lanes write while API requests read and write, so the
+# engine is tuned per backend. Pool sizes can be overridden with DB_POOL_SIZE,
+# DB_MAX_OVERFLOW and DB_POOL_TIMEOUT.
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "15000"))
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+PG_LOCK_TIMEOUT_MS = int(os.environ.get("PG_LOCK_TIMEOUT_MS", "0"))
+SLOW_STATEMENT_MS = int(os.environ.get("DB_SLOW_STATEMENT_MS", "100"))
+
+
+class DbStats:
+    # Pool checkout waits, statement time and lock errors, for /health/db and metrics.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.checkout_wait_s = 0.0
+            self.checkout_wait_max_s = 0.0
+            self.pool_timeouts = 0
+            self.statements = 0
+            self.statement_s = 0.0
+            self.slow_statements = 0
+            self.statement_max_s = 0.0
+            self.lock_errors = 0
+
+    def record_checkout(self, waited: float):
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_wait_s += waited
+            self.checkout_wait_max_s = max(self.checkout_wait_max_s, waited)
+
+    def record_statement(self, elapsed: float):
+        with self._lock:
+            self.statements += 1
+            self.statement_s += elapsed
+            self.statement_max_s = max(self.statement_max_s, elapsed)
+            if elapsed * 1000 >= SLOW_STATEMENT_MS:
+                self.slow_statements += 1
+
+    def record_pool_timeout(self):
+        with self._lock:
+            self.pool_timeouts += 1
+
+    def record_lock_error(self):
+        with self._lock:
+            self.lock_errors += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "checkout_wait_s": round(self.checkout_wait_s, 6),
+                "checkout_wait_max_s": round(self.checkout_wait_max_s, 6),
+                "pool_timeouts": self.pool_timeouts,
+                "statements": self.statements,
+                "statement_s": round(self.statement_s, 6),
+                "statement_max_s": round(self.statement_max_s, 6),
+                "slow_statements": self.slow_statements,
+                "lock_errors": self.lock_errors,
+            }
+
+
+db_stats = DbStats()
+
+
+class TimedQueuePool(QueuePool):
+    # Time spent waiting for a free connection is the first sign of an undersized pool.
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeout:
+            db_stats.record_pool_timeout()
+            raise
+        db_stats.record_checkout(time.perf_counter() - start)
+        return connection
+
+
+def _pool_options(pool_size: int, max_overflow: int) -> dict:
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", pool_size)),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", max_overflow)),
+        "pool_timeout": int(os.environ.get("DB_POOL_TIMEOUT", "30")),
+    }
+
+
+def sqlite_profile(url) -> dict:
+    memory = url.database in (None, "", ":memory:")
+    options = {
+        # pysqlite's own timeout is the busy handler used while waiting for the write lock.
+        "connect_args": {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+    }
+    if memory:
+        # Each connection would get its own empty database.
+        options["poolclass"] = StaticPool
+    else:
+        # One writer at a time, so a big pool only adds lock waiters.
+        options.update(_pool_options(pool_size=8, max_overflow=8))
+    return options
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers proceed while a send commits; NORMAL fsyncs at checkpoints only,
+    # which is durable against application crashes (not power loss) and far cheaper.
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+def postgresql_profile(url) -> dict:
+    options = _pool_options(pool_size=10, max_overflow=20)
+    server_options = "-c application_name=mailer"
+    if PG_LOCK_TIMEOUT_MS:
+        server_options += f" -c lock_timeout={PG_LOCK_TIMEOUT_MS}"
+    options.update(
+        pool_pre_ping=True,  # drop connections the server or a proxy closed while idle
+        pool_recycle=1800,
+        connect_args={"options": server_options},
+    )
+    return options
+
+
+PROFILES = {"sqlite": sqlite_profile, "postgresql": postgresql_profile}
+
+
+def _time_statements(engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _finish(conn, cursor, statement, parameters, context, executemany):
+        db_stats.record_statement(time.perf_counter() - conn.info["query_start"].pop())
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+        message = str(context.original_exception).lower()
+        # SQLite: "database is locked"; PostgreSQL: lock_timeout / deadlock.
+        if "locked" in message or "lock timeout" in message or "deadlock" in message:
+            db_stats.record_lock_error()
+
+
+def build_engine(database_url: str):
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    profile = PROFILES.get(backend)
+    engine = create_engine(url, **(profile(url) if profile else {}))
+    if backend == "sqlite" and url.database not in (None, "", ":memory:"):
+        event.listen(engine, "connect", _sqlite_pragmas)
+    _time_statements(engine)
+    return engine
+
+
+def pool_status() -> dict:
+    pool = engine.pool
+    status = {"backend": engine.dialect.name, "pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(size=pool.size(), checked_out=pool.checkedout(), overflow=pool.overflow(), idle=pool.checkedin())
+    return status
+
+
+def database_stats() -> dict:
+    return {**pool_status(), **db_stats.snapshot()}
+
+
+engine = build_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -15,3 +193,16 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini")
+
+
+def migrate(revision: str = "head"):
+    # Brings the schema up to date with migrations/ (see alembic.ini).
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(ALEMBIC_INI)
+    config.attributes["configure_logger"] = False
+    command.upgrade(config, revision)
@@ -1,19 +1,317 @@
 import base64
+import hashlib
+import mmap
 import os
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from email.mime.base import MIMEBase
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from email import encoders
-from typing import List, Optional
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple
 
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaIoBaseUpload
 from google.oauth2.credentials import Credentials
 
+from .metrics import gmail_request_seconds, quota_wait_seconds
+from .services.quota import QuotaGovernor, quota as default_quota
+
+HTTP_TIMEOUT = int(os.environ.get("GMAIL_HTTP_TIMEOUT", "60"))
+BATCH_SIZE = 50  # Gmail rejects larger batches with rateLimitExceeded
+# Messages above this size are spooled to disk and sent through the resumable
+# media upload endpoint instead of as an inline base64 ``raw`` field.
+INLINE_LIMIT = int(os.environ.get("GMAIL_INLINE_LIMIT_KB", "1024")) * 1024
+UPLOAD_CHUNK = 5 * 1024 * 1024
+ENCODE_CHUNK = 57 * 1024  # whole 76-column base64 lines per chunk
+
+
+class HistoryExpired(Exception):
+    pass
+
+
+RATE_LIMIT_REASONS = (b"rateLimitExceeded", b"userRateLimitExceeded")
+
+
+class GmailApiError(RuntimeError):
+    # ``retryable``: 429, 5xx and per-user rate-limit 403s; other 4xx are permanent
+    # for this message. ``retry_after`` is the server's Retry-After in seconds, if any.
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[float] = None, retryable: bool = True):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self.retryable = retryable
+
+    @classmethod
+    def from_http_error(cls, exc: HttpError) -> "GmailApiError":
+        status = int(exc.resp.status)
+        content = exc.content or b""
+        rate_limited = status == 429 or (status == 403 and any(r in content for r in RATE_LIMIT_REASONS))
+        return cls(
+            f"Gmail API error: {exc}",
+            status=status,
+            retry_after=_retry_after(exc.resp.get("retry-after")),
+            retryable=rate_limited or status >= 500,
+        )
+
+    @property
+    def rate_limited(self) -> bool:
+        return self.status == 429 or (self.status == 403 and self.retryable)
+
+
+def _retry_after(value: Optional[str]) -> Optional[float]:
+    # Delta-seconds or an HTTP date.
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def _default_http(credentials: Credentials):
+    return AuthorizedHttp(credentials, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+
+
+class ServicePool:
+    # Building the Gmail resource parses the discovery document and opens a new
+    # transport, so slots are built once per account and reused. httplib2 is not
+    # thread-safe, so each caller checks out its own slot.
+
+    def __init__(self, max_idle: int = 4, http_factory: Callable = _default_http):
+        self.max_idle = max_idle
+        self.http_factory = http_factory
+        self._lock = threading.Lock()
+        self._idle: Dict[str, List[Tuple[object, object]]] = {}
+        self._generation: Dict[str, int] = {}
+
+    def _build(self, credentials: Credentials):
+        http = self.http_factory(credentials)
+        service = build("gmail", "v1", http=http, cache_discovery=False)
+        return service, http
+
+    @contextmanager
+    def acquire(self, account: str, credentials: Credentials):
+        with self._lock:
+            generation = self._generation.get(account, 0)
+            idle = self._idle.get(account)
+            slot = idle.pop() if idle else None
+        if slot is None:
+            slot = self._build(credentials)
+        service, http = slot
+        if isinstance(http, AuthorizedHttp):
+            # Credentials may have been refreshed or reloaded since the slot was built.
+            http.credentials = credentials
+        try:
+            yield service
+        finally:
+            with self._lock:
+                idle = self._idle.setdefault(account, [])
+                if self._generation.get(account, 0) == generation and len(idle) < self.max_idle:
+                    idle.append(slot)
+                    slot = None
+            if slot is not None:
+                _close_http(slot[1])
+
+    def invalidate(self, account: Optional[str] = None):
+        with self._lock:
+            accounts = [account] if account is not None else list(self._idle)
+            dropped = []
+            for key in accounts:
+                self._generation[key] = self._generation.get(key, 0) + 1
+                dropped.extend(self._idle.pop(key, []))
+        for _, http in dropped:
+            _close_http(http)
+
+    def idle_count(self, account: str) -> int:
+        with self._lock:
+            return len(self._idle.get(account, []))
+
+
+def _close_http(http):
+    inner = getattr(http, "http", http)
+    close = getattr(inner, "close", None)
+    if close:
+        close()
+
+
+service_pool = ServicePool()
+
+
+def invalidate_service(account: Optional[str] = None):
+    service_pool.invalidate(account)
+
+
+class AttachmentCache:
+    # Base64-encoded attachment bodies keyed by the sha256 of the file content,
+    # evicted least-recently-used once ``max_bytes`` of encoded data is held.
+    # Bodies are kept as a tuple of line-aligned chunks, which avoids a second
+    # full-size copy when joining and lets a spooled file roll over to disk
+    # without buffering the whole attachment. Digests are remembered per
+    # (path, size, mtime) so an unchanged file is hashed once.
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._lock = threading.Lock()
+        self._encoded: "OrderedDict[str, Tuple[bytes, ...]]" = OrderedDict()
+        self._digests: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+
+    def write(self, path: str, out: BinaryIO) -> bool:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        stamp = (path, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            digest = self._digests.get(stamp)
+            chunks = self._encoded.get(digest) if digest else None
+            if chunks is not None:
+                self._encoded.move_to_end(digest)
+        if chunks is None:
+            with open(path, "rb") as f, _mapped(f, stat.st_size) as data:
+                digest = hashlib.sha256(data).hexdigest()
+                with self._lock:
+                    chunks = self._encoded.get(digest)
+                    self._remember(stamp, digest)
+                if chunks is None:
+                    encoded = (base64.encodebytes(data[i : i + ENCODE_CHUNK]) for i in range(0, len(data), ENCODE_CHUNK))
+                    if _encoded_size(stat.st_size) > self.max_bytes:
+                        # Too large to keep: encode straight to the output.
+                        for chunk in encoded:
+                            out.write(chunk)
+                        return True
+                    chunks = tuple(encoded)
+                    self._store(digest, chunks)
+        for chunk in chunks:
+            out.write(chunk)
+        return True
+
+    def _remember(self, stamp: Tuple[str, int, int], digest: str):
+        self._digests[stamp] = digest
+        self._digests.move_to_end(stamp)
+        while len(self._digests) > 1024:
+            self._digests.popitem(last=False)
+
+    def _store(self, digest: str, chunks: Tuple[bytes, ...]):
+        with self._lock:
+            if digest in self._encoded:
+                return
+            self._encoded[digest] = chunks
+            self.size += sum(map(len, chunks))
+            while self.size > self.max_bytes:
+                _, dropped = self._encoded.popitem(last=False)
+                self.size -= sum(map(len, dropped))
+
+    def clear(self):
+        with self._lock:
+            self._encoded.clear()
+            self._digests.clear()
+            self.size = 0
+
+
+@contextmanager
+def _mapped(f: BinaryIO, size: int):
+    if size == 0:
+        # mmap refuses empty files.
+        yield b""
+        return
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        yield data
+
+
+def _encoded_size(size: int) -> int:
+    return (size + 2) // 3 * 4 * 77 // 76
+
+
+attachment_cache = AttachmentCache(int(os.environ.get("ATTACHMENT_CACHE_MB", "64")) * 1024 * 1024)
+
+
+def write_message(
+    out: BinaryIO,
+    sender: str,
+    to: str,
+    subject: str,
+    body_html: str,
+    body_text: Optional[str] = None,
+    attachments: Optional[List[dict]] = None,
+    cache: Optional[AttachmentCache] = None,
+):
+    # Writes the RFC 822 message to ``out``. The headers and body parts come
+    # from the email package; attachment parts are appended after them so the
+    # encoded content is streamed from the cache rather than held in the tree.
+    cache = cache or attachment_cache
+    base_message = MIMEMultipart("alternative")
+    if body_text:
+        base_message.attach(MIMEText(body_text, "plain"))
+    base_message.attach(MIMEText(body_html, "html"))
+
+    message = MIMEMultipart("mixed")
+    message["To"] = to
+    message["From"] = sender
+    message["Subject"] = subject
+    message.attach(base_message)
+
+    head = message.as_bytes()
+    closing = f"--{message.get_boundary()}--".encode()
+    cut = head.rindex(closing)
+    out.write(head[:cut])
+    for attachment in attachments or []:
+        path = attachment.get("path")
+        if not path:
+            continue
+        part = MIMEBase("application", "octet-stream")
+        part["Content-Transfer-Encoding"] = "base64"
+        part.add_header("Content-Disposition", "attachment", filename=attachment.get("filename") or "")
+        part.set_payload("")
+        start = out.tell()
+        out.write(f"--{message.get_boundary()}\n".encode() + part.as_bytes())
+        if not cache.write(path, out):
+            # Missing files are skipped, as before.
+            out.seek(start)
+            out.truncate()
+    out.write(head[cut:])
+
 
 class GmailClient:
-    def __init__(self, credentials: Credentials):
+    def __init__(
+        self,
+        credentials: Credentials,
+        account: str = "default",
+        pool: Optional[ServicePool] = None,
+        quota: Optional[QuotaGovernor] = None,
+    ):
         self.credentials = credentials
+        self.account = account
+        self.pool = pool or service_pool
+        self.quota = quota or default_quota
+
+    def _execute(self, request, method: str, calls: int = 1, label: Optional[str] = None):
+        # Every API request is charged against the account's quota before it goes out.
+        waited = self.quota.acquire(self.account, method, calls)
+        if waited:
+            quota_wait_seconds.observe(waited, method=method)
+        try:
+            with gmail_request_seconds.time(method=label or method):
+                return request.execute()
+        except HttpError as exc:
+            error = GmailApiError.from_http_error(exc)
+            if error.rate_limited:
+                self.quota.backoff(self.account, error.retry_after)
+            raise
 
     def send_message(
         self,
@@ -24,45 +322,119 @@ class GmailClient:
         body_text: Optional[str] = None,
         attachments: Optional[List[dict]] = None,
     ):
-        base_message = MIMEMultipart("alternative")
-        if body_text:
-            base_message.attach(MIMEText(body_text, "plain"))
-        base_message.attach(MIMEText(body_html, "html"))
-
-        message = MIMEMultipart("mixed")
-        message["To"] = to
-        message["From"] = sender
-        message["Subject"] = subject
-        message.attach(base_message)
-
-        for attachment in attachments or []:
-            path = attachment.get("path")
-            if not path or not os.path.exists(path):
-                continue
-            part = MIMEBase("application", "octet-stream")
-            with open(path, "rb") as f:
-                part.set_payload(f.read())
-            encoders.encode_base64(part)
-            part.add_header("Content-Disposition", f"attachment; filename={attachment.get('filename')}")
-            message.attach(part)
-
-        raw = base64.urlsafe_b64encode(message.as_bytes()).decode()
-        try:
-            service = build("gmail", "v1", credentials=self.credentials)
-            sent = service.users().messages().send(userId="me", body={"raw": raw}).execute()
-            return sent
-        except HttpError as exc:
-            raise RuntimeError(f"Gmail API error: {exc}")
+        with tempfile.SpooledTemporaryFile(max_size=INLINE_LIMIT) as spool:
+            write_message(spool, sender, to, subject, body_html, body_text, attachments)
+            size = spool.tell()
+            spool.seek(0)
+            try:
+                with self.pool.acquire(self.account, self.credentials) as service:
+                    messages = service.users().messages()
+                    if size <= INLINE_LIMIT:
+                        raw = base64.urlsafe_b64encode(spool.read()).decode()
+                        return self._execute(messages.send(userId="me", body={"raw": raw}), "messages.send")
+                    media = MediaIoBaseUpload(spool, mimetype="message/rfc822", chunksize=UPLOAD_CHUNK, resumable=True)
+                    return self._execute(messages.send(userId="me", body={}, media_body=media), "messages.send")
+            except HttpError as exc:
+                raise GmailApiError.from_http_error(exc) from exc
 
     def thread_has_reply(self, thread_id: str, lead_email: str, sent_at) -> bool:
-        service = build("gmail", "v1", credentials=self.credentials)
-        thread = service.users().threads().get(userId="me", id=thread_id).execute()
-        messages = thread.get("messages", [])
-        for m in messages:
-            headers = m.get("payload", {}).get("headers", [])
-            header_dict = {h["name"].lower(): h["value"] for h in headers}
-            from_header = header_dict.get("from", "")
-            internal_date = int(m.get("internalDate", "0")) / 1000
-            if internal_date > sent_at.timestamp() and lead_email.lower() in from_header.lower():
+        try:
+            with self.pool.acquire(self.account, self.credentials) as service:
+                thread = self._execute(
+                    service.users().threads().get(userId="me", id=thread_id, format="metadata", metadataHeaders=["From"]),
+                    "threads.get",
+                )
+        except HttpError as exc:
+            raise GmailApiError.from_http_error(exc) from exc
+        sent_ms = _epoch_ms(sent_at)
+        for m in thread.get("messages", []):
+            summary = _message_summary(m)
+            if summary["internal_date"] > sent_ms and lead_email.lower() in summary["from"].lower():
                 return True
         return False
+
+    def current_history_id(self) -> str:
+        with self.pool.acquire(self.account, self.credentials) as service:
+            profile = self._execute(service.users().getProfile(userId="me"), "users.getProfile")
+        return str(profile["historyId"])
+
+    def list_history(self, start_history_id: str) -> Tuple[List[dict], str]:
+        added: List[dict] = []
+        page_token = None
+        history_id = start_history_id
+        with self.pool.acquire(self.account, self.credentials) as service:
+            while True:
+                try:
+                    resp = self._execute(
+                        service.users()
+                        .history()
+                        .list(
+                            userId="me",
+                            startHistoryId=start_history_id,
+                            historyTypes=["messageAdded"],
+                            labelId="INBOX",
+                            pageToken=page_token,
+                        ),
+                        "history.list",
+                    )
+                except HttpError as exc:
+                    if exc.resp.status == 404:
+                        raise HistoryExpired(start_history_id)
+                    raise
+                for record in resp.get("history", []):
+                    for entry in record.get("messagesAdded", []):
+                        message = entry.get("message", {})
+                        added.append({"id": message.get("id"), "threadId": message.get("threadId")})
+                history_id = str(resp.get("historyId", history_id))
+                page_token = resp.get("nextPageToken")
+                if not page_token:
+                    break
+        return added, history_id
+
+    def message_senders(self, message_ids: List[str]) -> List[dict]:
+        return self._batched_metadata("messages", message_ids, lambda m: [_message_summary(m)])
+
+    def thread_senders(self, thread_ids: List[str]) -> List[dict]:
+        return self._batched_metadata(
+            "threads", thread_ids, lambda t: [_message_summary(m) for m in t.get("messages", [])]
+        )
+
+    def _batched_metadata(self, resource: str, ids: List[str], unpack: Callable) -> List[dict]:
+        results: List[dict] = []
+
+        def collect(request_id, response, exception):
+            if exception is not None:
+                if isinstance(exception, HttpError) and exception.resp.status == 404:
+                    return
+                raise exception
+            results.extend(unpack(response))
+
+        with self.pool.acquire(self.account, self.credentials) as service:
+            for start in range(0, len(ids), BATCH_SIZE):
+                batch = service.new_batch_http_request(callback=collect)
+                chunk = ids[start : start + BATCH_SIZE]
+                for item_id in chunk:
+                    batch.add(
+                        getattr(service.users(), resource)().get(
+                            userId="me", id=item_id, format="metadata", metadataHeaders=["From"]
+                        )
+                    )
+                self._execute(batch, f"{resource}.get", calls=len(chunk), label=f"{resource}.batchGet")
+        return results
+
+
+def _epoch_ms(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
+
+def _message_summary(message: dict) -> dict:
+    headers = message.get("payload", {}).get("headers", [])
+    from_header = next((h["value"] for h in headers if h["name"].lower() == "from"), "")
+    return {
+        "id": message.get("id"),
+        "threadId": message.get("threadId"),
+        "from": from_header,
+        "internal_date": int(message.get("internalDate", "0")),
+    }
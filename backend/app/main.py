@@ -1,16 +1,21 @@
 import os
 from fastapi import Depends, FastAPI
+from fastapi.responses import Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 
 from . import models
-from .db import Base, engine, get_db, SessionLocal
+from .auth_google import credential_manager
+from .db import database_stats, get_db, migrate
+from .metrics import CONTENT_TYPE, registry
 from .scheduler import add_interval_job, start_scheduler
-from .services.sender import ensure_settings, process_queue
-from .routes import auth, leads, campaigns, settings, logs, queue, unsubscribe, templates
+from .services.dispatch import dispatcher
+from .services.sender import ensure_settings
+from .services.uploads import sweep_orphans
+from .routes import auth, leads, campaigns, settings, logs, queue, unsubscribe, templates, jobs, segments
 
-Base.metadata.create_all(bind=engine)
+migrate()
 
 app = FastAPI(title="Mailer")
 
@@ -29,26 +34,41 @@ app.include_router(settings.router, prefix="/api")
 app.include_router(logs.router, prefix="/api")
 app.include_router(queue.router, prefix="/api")
 app.include_router(templates.router, prefix="/api")
+app.include_router(jobs.router, prefix="/api")
+app.include_router(segments.router, prefix="/api")
 app.include_router(unsubscribe.router)
 
 app.mount("/uploads", StaticFiles(directory=os.environ.get("UPLOAD_ROOT", "uploads")), name="uploads")
 
 
-def _tick_queue():
-    db = SessionLocal()
-    try:
-        process_queue(db)
-    finally:
-        db.close()
-
-
 @app.on_event("startup")
 def startup_event():
+    credential_manager.start()
     start_scheduler()
-    add_interval_job(_tick_queue, minutes=1)
+    add_interval_job(sweep_orphans, minutes=60)
+    # Set EMBEDDED_WORKER=0 when queue draining runs in separate `python -m app.worker` processes.
+    if os.environ.get("EMBEDDED_WORKER", "1") != "0":
+        dispatcher.start()
+
+
+@app.on_event("shutdown")
+def shutdown_event():
+    dispatcher.stop(wait=False)
 
 
 @app.get("/health")
 def health(db: Session = Depends(get_db)):
     ensure_settings(db)
     return {"status": "ok"}
+
+
+@app.get("/health/db")
+def health_db():
+    # Pool occupancy, checkout waits, statement time and lock errors since start.
+    return database_stats()
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    # Prometheus scrape target; see app/metrics.py for what is exported.
+    return Response(registry.render(), media_type=CONTENT_TYPE)
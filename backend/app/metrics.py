@@ -0,0 +1,274 @@
+"""Process-local metrics in the Prometheus text exposition format.
+
+Recording is a dict lookup and an add under a per-metric lock, so it stays on
+in production. Each process (API, ``python -m app.worker``) has its own
+registry; the API serves it at ``/metrics`` and a worker does when
+``METRICS_PORT`` is set.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+
+from .db import SessionLocal, database_stats
+from .models import ScheduledSend
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+TICK_BUCKETS = (0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600)
+COUNT_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000)
+# The queue gauges cost a GROUP BY over scheduled_sends; scrapes closer
+# together than this reuse the last values.
+QUEUE_REFRESH_SECONDS = float(os.environ.get("METRICS_QUEUE_REFRESH_SECONDS", "10"))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class _Sampled(_Metric):
+    # One value per label set.
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in values]
+
+
+class Counter(_Sampled):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value: float, **labels):
+        # For a running total kept elsewhere (database_stats).
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Gauge(_Sampled):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_all(self, samples: Iterable[Tuple[dict, float]]):
+        # Replaces every label set at once, so series that went away stop being exported.
+        values = {self._key(labels): value for labels, value in samples}
+        with self._lock:
+            self._values = values
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (last is +Inf), sum]
+        self._values: Dict[Tuple, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted((k, (list(counts), total[0])) for k, (counts, total) in self._values.items())
+        lines = self.header()
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn: Callable[[], None]):
+        # Runs before each render to refresh gauges that are read, not recorded.
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        for collect in self._collectors:
+            try:
+                collect()
+            except Exception:  # pragma: no cover - a failing collector must not break the scrape
+                scrape_errors.inc()
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+counter = lambda *a, **kw: registry.register(Counter(*a, **kw))  # noqa: E731
+gauge = lambda *a, **kw: registry.register(Gauge(*a, **kw))  # noqa: E731
+histogram = lambda *a, **kw: registry.register(Histogram(*a, **kw))  # noqa: E731
+
+gmail_request_seconds = histogram(
+    "mailer_gmail_request_seconds", "Gmail API call latency.", ["method"], buckets=LATENCY_BUCKETS
+)
+quota_wait_seconds = histogram(
+    "mailer_gmail_quota_wait_seconds", "Time a Gmail call waited for the account's quota bucket.", ["method"]
+)
+tick_seconds = histogram("mailer_tick_seconds", "Duration of one process_queue pass for an account.", buckets=TICK_BUCKETS)
+tick_items = histogram("mailer_tick_items", "Queue items handled in one process_queue pass.", buckets=COUNT_BUCKETS)
+sends_total = counter("mailer_sends_total", "Send log entries written, by step and status.", ["step", "status"])
+queue_depth = gauge("mailer_queue_depth", "scheduled_sends rows by step and status.", ["step", "status"])
+queue_due = gauge("mailer_queue_due", "Queued items whose scheduled_at has passed.")
+queue_lag_seconds = gauge("mailer_queue_lag_seconds", "Now minus the oldest due scheduled_at (0 when nothing is due).")
+send_failures_total = counter("mailer_send_failures_total", "Failed sends, by whether they were rescheduled or dead-lettered.", ["outcome"])
+credential_refresh_total = counter("mailer_credential_refresh_total", "OAuth token refreshes.", ["result"])
+errors_total = counter("mailer_errors_total", "Exceptions caught and handled, by component and class.", ["component", "type"])
+scrape_errors = counter("mailer_metrics_collector_errors_total", "Collectors that failed during a scrape.")
+db_query_seconds = counter("mailer_db_query_seconds_total", "Time spent executing SQL statements.")
+db_queries = counter("mailer_db_queries_total", "SQL statements executed.")
+db_slow_queries = counter("mailer_db_slow_queries_total", "Statements slower than DB_SLOW_STATEMENT_MS.")
+db_checkout_wait_seconds = counter("mailer_db_pool_wait_seconds_total", "Time spent waiting for a pooled connection.")
+db_pool_timeouts = counter("mailer_db_pool_timeouts_total", "Pool checkouts that timed out.")
+db_lock_errors = counter("mailer_db_lock_errors_total", "Statements that failed on a database lock.")
+db_pool = gauge("mailer_db_pool_connections", "Pooled connections by state.", ["state"])
+
+
+def record_error(component: str, exc: BaseException):
+    errors_total.inc(component=component, type=type(exc).__name__)
+
+
+@registry.collector
+def _collect_db():
+    stats = database_stats()
+    db_query_seconds.set_total(stats["statement_s"])
+    db_queries.set_total(stats["statements"])
+    db_slow_queries.set_total(stats["slow_statements"])
+    db_checkout_wait_seconds.set_total(stats["checkout_wait_s"])
+    db_pool_timeouts.set_total(stats["pool_timeouts"])
+    db_lock_errors.set_total(stats["lock_errors"])
+    for state in ("checked_out", "idle"):
+        if state in stats:
+            db_pool.set(stats[state], state=state)
+
+
+_queue_collected = 0.0
+
+
+@registry.collector
+def _collect_queue():
+    global _queue_collected
+    if _queue_collected and time.monotonic() - _queue_collected < QUEUE_REFRESH_SECONDS:
+        return
+    _queue_collected = time.monotonic()
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        rows = db.query(ScheduledSend.step, ScheduledSend.status, func.count(ScheduledSend.id)).group_by(
+            ScheduledSend.step, ScheduledSend.status
+        )
+        queue_depth.set_all(({"step": step, "status": status or ""}, count) for step, status, count in rows)
+        due = db.query(func.count(ScheduledSend.id), func.min(ScheduledSend.scheduled_at)).filter(
+            ScheduledSend.status == "queued", ScheduledSend.scheduled_at <= now
+        )
+        count, oldest = due.one()
+        queue_due.set(count)
+        queue_lag_seconds.set(round((now - oldest).total_seconds(), 3) if oldest else 0)
+    finally:
+        db.close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port: int, host: str = "0.0.0.0") -> Optional[ThreadingHTTPServer]:
+    # For processes without the API (the standalone worker).
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
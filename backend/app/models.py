@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import JSON, Boolean, Column, Date, DateTime, ForeignKey, Index, Integer, String, Text, UniqueConstraint
 from sqlalchemy.orm import relationship
 
 from .db import Base
@@ -20,6 +20,10 @@ class Lead(Base):
     consent = Column(Boolean, default=False)
     unsubscribed = Column(Boolean, default=False)
     first_name = Column(String, nullable=True)
+    # Promoted from custom fields so segments can filter on an index.
+    company = Column(String, nullable=True, index=True)
+    country = Column(String, nullable=True, index=True)
+    custom_fields = Column(JSON, nullable=True)  # extra CSV columns, usable as {{placeholders}}
     created_at = Column(DateTime, default=datetime.utcnow)
     unsubscribe_token = Column(String, unique=True, default=lambda: str(uuid.uuid4()))
 
@@ -36,16 +40,41 @@ class Campaign(Base):
     mail2_body = Column(Text, nullable=False)
     delay_days = Column(Integer, default=3)
     paused = Column(Boolean, default=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)  # null = default account
+    segment_id = Column(Integer, ForeignKey("segments.id"), nullable=True)  # null = every eligible lead
+    # Slot share among the account's campaigns (services/fair_share.py): higher
+    # priority sends first, equal priorities split slots by weight.
+    priority = Column(Integer, nullable=False, default=0, server_default="0")
+    weight = Column(Integer, nullable=False, default=1, server_default="1")
     created_at = Column(DateTime, default=datetime.utcnow)
 
     logs = relationship("SendLog", back_populates="campaign")
 
 
+class Segment(Base):
+    __tablename__ = "segments"
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    rules = Column(JSON, nullable=False)  # see services/segments.py
+    # Cached number of eligible leads matching ``rules``; NULL until counted again.
+    # ``revision`` moves on every change so a slow recount never stores a stale value.
+    lead_count = Column(Integer, nullable=True)
+    counted_at = Column(DateTime, nullable=True)
+    revision = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
 class SendLog(Base):
     __tablename__ = "send_logs"
+    __table_args__ = (
+        Index("ix_send_logs_lead_campaign_step_status_sent_at", "lead_id", "campaign_id", "step", "status", "sent_at"),
+        Index("ix_send_logs_campaign_id_id", "campaign_id", "id"),
+        Index("ix_send_logs_status_sent_at", "status", "sent_at"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     lead_id = Column(Integer, ForeignKey("leads.id"))
     campaign_id = Column(Integer, ForeignKey("campaigns.id"))
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
     step = Column(String, nullable=False)  # mail1 or mail2
     status = Column(String, nullable=False)
     scheduled_at = Column(DateTime)
@@ -58,9 +87,72 @@ class SendLog(Base):
     campaign = relationship("Campaign", back_populates="logs")
 
 
+class CampaignStat(Base):
+    # Running counters kept in step with send_logs and scheduled_sends; "queued"
+    # is the number of scheduled_sends rows still pending for the step.
+    __tablename__ = "campaign_stats"
+    __table_args__ = (UniqueConstraint("campaign_id", "step", "status", name="uq_campaign_stats_key"),)
+    id = Column(Integer, primary_key=True, index=True)
+    campaign_id = Column(Integer, ForeignKey("campaigns.id"), nullable=False)
+    step = Column(String, nullable=False)
+    status = Column(String, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class CampaignDailyStat(Base):
+    __tablename__ = "campaign_daily_stats"
+    __table_args__ = (UniqueConstraint("campaign_id", "day", name="uq_campaign_daily_stats_key"),)
+    id = Column(Integer, primary_key=True, index=True)
+    campaign_id = Column(Integer, ForeignKey("campaigns.id"), nullable=False)
+    day = Column(Date, nullable=False)  # UTC date of sent_at
+    sent = Column(Integer, nullable=False, default=0)
+
+
+class Reply(Base):
+    __tablename__ = "replies"
+    __table_args__ = (UniqueConstraint("lead_id", "campaign_id", name="uq_replies_lead_campaign"),)
+    id = Column(Integer, primary_key=True, index=True)
+    lead_id = Column(Integer, ForeignKey("leads.id"), nullable=False)
+    campaign_id = Column(Integer, ForeignKey("campaigns.id"), nullable=False)
+    thread_id = Column(String)
+    message_id = Column(String)
+    detected_at = Column(DateTime, default=datetime.utcnow)
+
+
+class MailboxSync(Base):
+    __tablename__ = "mailbox_sync"
+    id = Column(Integer, primary_key=True, index=True)
+    account = Column(String, unique=True, index=True, nullable=False)
+    history_id = Column(String)
+    synced_at = Column(DateTime)
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+    id = Column(String, primary_key=True, default=lambda: uuid.uuid4().hex)
+    kind = Column(String, nullable=False)
+    status = Column(String, default="queued")  # queued, running, done, failed
+    total = Column(Integer)
+    processed = Column(Integer, default=0)
+    rejected = Column(Integer, default=0)
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime)
+
+
+class JobRejection(Base):
+    __tablename__ = "job_rejections"
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(String, ForeignKey("jobs.id"), index=True, nullable=False)
+    row_number = Column(Integer, nullable=False)
+    reason = Column(String, nullable=False)
+    value = Column(Text)
+
+
 class Settings(Base):
     __tablename__ = "settings"
     id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), unique=True, index=True, nullable=True)  # null = defaults
     start_time = Column(String, default="09:00")
     end_time = Column(String, default="17:00")
     interval_min = Column(Integer, default=3)
@@ -71,12 +163,22 @@ class Settings(Base):
 
 class ScheduledSend(Base):
     __tablename__ = "scheduled_sends"
+    __table_args__ = (
+        Index("ix_scheduled_sends_status_scheduled_at", "status", "scheduled_at"),
+        Index("ix_scheduled_sends_scheduled_at_id", "scheduled_at", "id"),
+        Index("ix_scheduled_sends_campaign_id_status", "campaign_id", "status"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     lead_id = Column(Integer, ForeignKey("leads.id"))
     campaign_id = Column(Integer, ForeignKey("campaigns.id"))
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
     step = Column(String, nullable=False)
     scheduled_at = Column(DateTime, nullable=False)
     status = Column(String, default="queued")
+    lease_owner = Column(String)
+    lease_expires_at = Column(DateTime)
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    last_error = Column(Text)
 
     lead = relationship("Lead")
     campaign = relationship("Campaign")
@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
-from ..auth_google import auth_url, current_user, disconnect, exchange_code
+from ..auth_google import auth_url, current_user, disconnect, exchange_code, list_accounts
 from ..db import get_db
+from ..models import User
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -24,9 +25,15 @@ def me(db: Session = Depends(get_db)):
     return {"email": user.email} if user else {}
 
 
+@router.get("/accounts")
+def accounts(db: Session = Depends(get_db)):
+    default = current_user(db)
+    return [{"id": u.id, "email": u.email, "default": u.id == default.id} for u in list_accounts(db)]
+
+
 @router.post("/disconnect")
-def disconnect_account(db: Session = Depends(get_db)):
-    user = current_user(db)
+def disconnect_account(user_id: int | None = None, db: Session = Depends(get_db)):
+    user = db.get(User, user_id) if user_id is not None else current_user(db)
     if not user:
         raise HTTPException(status_code=404, detail="No account connected")
     disconnect(db, user)
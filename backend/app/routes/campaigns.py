@@ -1,22 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException
+import pytz
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
 from sqlalchemy.orm import Session
 
 from ..db import get_db
-from ..models import Campaign, Lead
-from ..services.sender import schedule_campaign
+from ..models import Campaign, Segment, User
+from ..schemas import ForecastIn
+from ..services.forecast import forecast
+from ..services.jobs import create_job, job_payload, run_job
+from ..services.segments import segment_count
+from ..services.sender import pause_sends, resume_sends, schedule_campaign
+from ..services.stats import campaign_stats, rebuild_stats
 
 router = APIRouter(prefix="/campaigns", tags=["campaigns"])
 
 
 @router.post("")
-def create_campaign(payload: dict, db: Session = Depends(get_db)):
+def create_campaign(payload: dict, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    if payload.get("user_id") is not None and not db.get(User, payload["user_id"]):
+        raise HTTPException(status_code=400, detail="Unknown sending account")
+    if payload.get("segment_id") is not None and not db.get(Segment, payload["segment_id"]):
+        raise HTTPException(status_code=400, detail="Unknown segment")
+    if not isinstance(payload.get("weight", 1), int) or payload.get("weight", 1) < 1:
+        raise HTTPException(status_code=400, detail="weight must be a positive integer")
+    if not isinstance(payload.get("priority", 0), int):
+        raise HTTPException(status_code=400, detail="priority must be an integer")
     campaign = Campaign(**payload)
     db.add(campaign)
     db.commit()
     db.refresh(campaign)
-    leads = db.query(Lead).all()
-    schedule_campaign(db, campaign.id, leads)
-    return campaign
+    campaign_id = campaign.id
+    job = create_job(db, "schedule_campaign")
+    background_tasks.add_task(
+        run_job, job.id, lambda job_db, job_row: schedule_campaign(job_db, campaign_id, job_row)
+    )
+    return {"id": campaign_id, "job": job_payload(job)}
 
 
 @router.get("")
@@ -24,11 +41,56 @@ def list_campaigns(db: Session = Depends(get_db)):
     return db.query(Campaign).all()
 
 
+@router.post("/forecast")
+def forecast_campaign(payload: ForecastIn, db: Session = Depends(get_db)):
+    # Dry run of schedule_campaign: when a campaign created now would send, without queueing anything.
+    if payload.user_id is not None and not db.get(User, payload.user_id):
+        raise HTTPException(status_code=400, detail="Unknown sending account")
+    segment = db.get(Segment, payload.segment_id) if payload.segment_id is not None else None
+    if payload.segment_id is not None and segment is None:
+        raise HTTPException(status_code=400, detail="Unknown segment")
+    lead_count = payload.lead_count
+    if lead_count is None and segment is not None:
+        lead_count = segment_count(db, segment)
+    try:
+        return forecast(
+            db,
+            user_id=payload.user_id,
+            lead_count=lead_count,
+            delay_days=payload.delay_days,
+            reply_rate=payload.reply_rate,
+            overrides=payload.settings,
+        )
+    except (TypeError, ValueError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except pytz.UnknownTimeZoneError as exc:
+        raise HTTPException(status_code=400, detail=f"Unknown timezone {exc}")
+
+
 @router.post("/{campaign_id}/pause")
 def pause_campaign(campaign_id: int, pause: bool, db: Session = Depends(get_db)):
     campaign = db.query(Campaign).get(campaign_id)
     if not campaign:
         raise HTTPException(status_code=404, detail="Campaign not found")
-    campaign.paused = pause
-    db.commit()
-    return {"status": "updated"}
+    if pause:
+        return {"status": "updated", "held": pause_sends(db, campaign)}
+    resumed, resumes_at = resume_sends(db, campaign)
+    return {"status": "updated", "resumed": resumed, "resumes_at": resumes_at}
+
+
+@router.get("/{campaign_id}/stats")
+def read_campaign_stats(campaign_id: int, days: int = 30, db: Session = Depends(get_db)):
+    if not db.get(Campaign, campaign_id):
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    return campaign_stats(db, campaign_id, max(1, min(days, 366)))
+
+
+@router.post("/{campaign_id}/stats/rebuild")
+def rebuild_campaign_stats(campaign_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    if not db.get(Campaign, campaign_id):
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    job = create_job(db, "rebuild_stats")
+    background_tasks.add_task(
+        run_job, job.id, lambda job_db, job_row: rebuild_stats(job_db, job_row, campaign_id)
+    )
+    return job_payload(job)
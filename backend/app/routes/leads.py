@@ -1,46 +1,81 @@
-import csv
-from io import StringIO
-from typing import List
+import os
+from functools import partial
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from ..db import get_db
-from ..models import Lead
+from ..models import Job, JobRejection, Lead
+from ..schemas import LeadOut, LeadPage
+from ..services.jobs import create_job, job_payload, run_job
+from ..services.lead_import import LeadImportError, check_header, import_leads, spool_upload
+from ..services.pagination import (
+    EXPORT_FORMATS,
+    PAGE_SIZE,
+    CursorError,
+    export_rows,
+    json_response,
+    keyset_page,
+)
+from ..services.segments import adjust_segments, is_eligible
 
 router = APIRouter(prefix="/leads", tags=["leads"])
 
+LEAD_COLUMNS = [getattr(Lead, name) for name in LeadOut.model_fields]
+
 
 @router.post("/upload")
-def upload_leads(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    content = file.file.read().decode()
-    reader = csv.DictReader(StringIO(content))
-    required = {"email", "consent"}
-    if not required.issubset(set(reader.fieldnames or [])):
-        raise HTTPException(status_code=400, detail="CSV must include email and consent columns")
-    created = 0
-    for row in reader:
-        email = row.get("email", "").strip().lower()
-        consent = str(row.get("consent", "")).lower() in {"true", "1", "yes"}
-        first_name = row.get("first_name")
-        if not email:
-            continue
-        lead = db.query(Lead).filter(Lead.email == email).first()
-        if lead:
-            lead.consent = consent
-            lead.first_name = first_name
-        else:
-            lead = Lead(email=email, consent=consent, first_name=first_name)
-            db.add(lead)
-        created += 1
-    db.commit()
-    return {"count": created}
+def upload_leads(background_tasks: BackgroundTasks, file: UploadFile = File(...), db: Session = Depends(get_db)):
+    path = spool_upload(file.file)
+    queued = False
+    try:
+        check_header(path)
+        job = create_job(db, "lead_import")
+        background_tasks.add_task(run_job, job.id, partial(import_leads, path=path))
+        queued = True
+    except LeadImportError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    finally:
+        # Once queued, import_leads removes the file when it is done with it.
+        if not queued:
+            os.remove(path)
+    return job_payload(job)
+
+
+@router.get("/imports/{job_id}/rejections")
+def list_import_rejections(job_id: str, offset: int = 0, limit: int = 500, db: Session = Depends(get_db)):
+    if not db.get(Job, job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    rows = (
+        db.query(JobRejection.row_number, JobRejection.reason, JobRejection.value)
+        .filter(JobRejection.job_id == job_id)
+        .order_by(JobRejection.row_number)
+        .offset(offset)
+        .limit(min(limit, 5000))
+    )
+    return [{"row": row_number, "reason": reason, "value": value} for row_number, reason, value in rows]
+
+
+@router.get("", response_model=LeadPage)
+def list_leads(cursor: str | None = None, limit: int = PAGE_SIZE, db: Session = Depends(get_db)):
+    try:
+        rows, next_cursor = keyset_page(db.query(*LEAD_COLUMNS), [Lead.id], cursor, limit)
+    except CursorError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return json_response(LeadPage(items=[LeadOut.model_validate(row) for row in rows], next_cursor=next_cursor))
 
 
-@router.get("")
-def list_leads(db: Session = Depends(get_db)):
-    leads = db.query(Lead).all()
-    return leads
+@router.get("/export")
+def export_leads(format: str = "ndjson"):
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    rows = export_rows(lambda db: db.query(*LEAD_COLUMNS), [Lead.id], LeadOut, format)
+    return StreamingResponse(
+        rows,
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f"attachment; filename=leads.{format}"},
+    )
 
 
 @router.post("/{lead_id}/consent")
@@ -48,6 +83,9 @@ def update_consent(lead_id: int, consent: bool, db: Session = Depends(get_db)):
     lead = db.query(Lead).get(lead_id)
     if not lead:
         raise HTTPException(status_code=404, detail="Lead not found")
+    was_eligible = is_eligible(lead)
     lead.consent = consent
+    if is_eligible(lead) != was_eligible:
+        adjust_segments(db, lead.id, 1 if consent else -1)
     db.commit()
     return {"status": "updated"}
@@ -1,15 +1,43 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from ..db import get_db
 from ..models import SendLog
+from ..schemas import LogOut, LogPage
+from ..services.pagination import EXPORT_FORMATS, PAGE_SIZE, CursorError, export_rows, json_response, keyset_page
 
 router = APIRouter(prefix="/logs", tags=["logs"])
 
+LOG_COLUMNS = [getattr(SendLog, name) for name in LogOut.model_fields]
 
-@router.get("")
-def list_logs(campaign_id: int | None = None, db: Session = Depends(get_db)):
-    q = db.query(SendLog)
+
+def _logs_query(db: Session, campaign_id: int | None):
+    q = db.query(*LOG_COLUMNS)
     if campaign_id:
         q = q.filter(SendLog.campaign_id == campaign_id)
-    return q.order_by(SendLog.id.desc()).limit(500).all()
+    return q
+
+
+@router.get("", response_model=LogPage)
+def list_logs(
+    campaign_id: int | None = None, cursor: str | None = None, limit: int = PAGE_SIZE, db: Session = Depends(get_db)
+):
+    # Newest first; the cursor pages back through older entries.
+    try:
+        rows, next_cursor = keyset_page(_logs_query(db, campaign_id), [SendLog.id], cursor, limit, descending=True)
+    except CursorError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return json_response(LogPage(items=[LogOut.model_validate(row) for row in rows], next_cursor=next_cursor))
+
+
+@router.get("/export")
+def export_logs(format: str = "ndjson", campaign_id: int | None = None):
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    rows = export_rows(lambda db: _logs_query(db, campaign_id), [SendLog.id], LogOut, format, descending=True)
+    return StreamingResponse(
+        rows,
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f"attachment; filename=logs.{format}"},
+    )
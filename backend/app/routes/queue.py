@@ -1,12 +1,74 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from ..db import get_db
 from ..models import ScheduledSend
+from ..schemas import QueueItemOut, QueuePage
+from ..services.pagination import EXPORT_FORMATS, PAGE_SIZE, CursorError, export_rows, json_response, keyset_page
+from ..services.sender import requeue_failed
 
 router = APIRouter(prefix="/queue", tags=["queue"])
 
+QUEUE_COLUMNS = [getattr(ScheduledSend, name) for name in QueueItemOut.model_fields]
+QUEUE_ORDER = [ScheduledSend.scheduled_at, ScheduledSend.id]
 
-@router.get("")
-def list_queue(db: Session = Depends(get_db)):
-    return db.query(ScheduledSend).order_by(ScheduledSend.scheduled_at).all()
+
+def _queue_query(db: Session, status: str | None, campaign_id: int | None = None):
+    q = db.query(*QUEUE_COLUMNS)
+    if status:
+        q = q.filter(ScheduledSend.status == status)
+    if campaign_id:
+        q = q.filter(ScheduledSend.campaign_id == campaign_id)
+    return q
+
+
+@router.get("", response_model=QueuePage)
+def list_queue(
+    cursor: str | None = None, limit: int = PAGE_SIZE, status: str | None = None, db: Session = Depends(get_db)
+):
+    try:
+        rows, next_cursor = keyset_page(_queue_query(db, status), QUEUE_ORDER, cursor, limit)
+    except CursorError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return json_response(QueuePage(items=[QueueItemOut.model_validate(row) for row in rows], next_cursor=next_cursor))
+
+
+@router.get("/export")
+def export_queue(format: str = "ndjson", status: str | None = None):
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    rows = export_rows(lambda db: _queue_query(db, status), QUEUE_ORDER, QueueItemOut, format)
+    return StreamingResponse(
+        rows,
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f"attachment; filename=queue.{format}"},
+    )
+
+
+@router.get("/dead-letter", response_model=QueuePage)
+def list_dead_letter(
+    cursor: str | None = None, limit: int = PAGE_SIZE, campaign_id: int | None = None, db: Session = Depends(get_db)
+):
+    # Sends that ran out of attempts or hit a permanent Gmail error; see last_error.
+    try:
+        rows, next_cursor = keyset_page(_queue_query(db, "failed", campaign_id), QUEUE_ORDER, cursor, limit)
+    except CursorError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return json_response(QueuePage(items=[QueueItemOut.model_validate(row) for row in rows], next_cursor=next_cursor))
+
+
+@router.post("/dead-letter/retry")
+def retry_dead_letter(campaign_id: int | None = None, db: Session = Depends(get_db)):
+    return {"requeued": requeue_failed(db, campaign_id=campaign_id)}
+
+
+@router.post("/{item_id}/retry")
+def retry_item(item_id: int, db: Session = Depends(get_db)):
+    item = db.get(ScheduledSend, item_id)
+    if not item:
+        raise HTTPException(status_code=404, detail="Queue item not found")
+    if item.status != "failed":
+        raise HTTPException(status_code=409, detail="Only failed items can be retried")
+    requeue_failed(db, item_ids=[item_id])
+    return {"requeued": 1}
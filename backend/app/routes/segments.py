@@ -0,0 +1,75 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from ..db import get_db
+from ..models import Campaign, Segment
+from ..services.segments import SegmentError, compile_rules, segment_leads, segment_payload
+
+router = APIRouter(prefix="/segments", tags=["segments"])
+
+
+def _rules(payload: dict):
+    rules = payload.get("rules")
+    try:
+        compile_rules(rules)
+    except SegmentError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return rules
+
+
+@router.post("")
+def create_segment(payload: dict, db: Session = Depends(get_db)):
+    if not payload.get("name"):
+        raise HTTPException(status_code=400, detail="name is required")
+    segment = Segment(name=payload["name"], rules=_rules(payload))
+    db.add(segment)
+    db.commit()
+    db.refresh(segment)
+    return segment_payload(db, segment)
+
+
+@router.post("/preview")
+def preview_segment(payload: dict, db: Session = Depends(get_db)):
+    # Counts what ``rules`` would match without saving a segment.
+    return {"lead_count": segment_leads(db, Segment(rules=_rules(payload))).count()}
+
+
+@router.get("")
+def list_segments(db: Session = Depends(get_db)):
+    return [segment_payload(db, segment) for segment in db.query(Segment).order_by(Segment.id)]
+
+
+@router.get("/{segment_id}")
+def read_segment(segment_id: int, db: Session = Depends(get_db)):
+    segment = db.get(Segment, segment_id)
+    if not segment:
+        raise HTTPException(status_code=404, detail="Segment not found")
+    return segment_payload(db, segment)
+
+
+@router.put("/{segment_id}")
+def update_segment(segment_id: int, payload: dict, db: Session = Depends(get_db)):
+    segment = db.get(Segment, segment_id)
+    if not segment:
+        raise HTTPException(status_code=404, detail="Segment not found")
+    if "name" in payload:
+        segment.name = payload["name"] or segment.name
+    if "rules" in payload:
+        segment.rules = _rules(payload)
+        segment.lead_count = None
+        segment.revision += 1
+    db.commit()
+    db.refresh(segment)
+    return segment_payload(db, segment)
+
+
+@router.delete("/{segment_id}")
+def delete_segment(segment_id: int, db: Session = Depends(get_db)):
+    segment = db.get(Segment, segment_id)
+    if not segment:
+        raise HTTPException(status_code=404, detail="Segment not found")
+    if db.query(Campaign.id).filter(Campaign.segment_id == segment_id).first():
+        raise HTTPException(status_code=409, detail="Segment is used by a campaign")
+    db.delete(segment)
+    db.commit()
+    return {"status": "deleted"}
@@ -1,24 +1,43 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
 from ..db import get_db
-from ..models import Settings
-from ..services.sender import ensure_settings
+from ..models import Settings, User
+from ..services.sender import SETTINGS_FIELDS, ensure_settings, override_settings
 
 router = APIRouter(prefix="/settings", tags=["settings"])
 
 
+def _check_account(db: Session, user_id: int | None):
+    if user_id is not None and not db.get(User, user_id):
+        raise HTTPException(status_code=404, detail="Account not found")
+
+
 @router.get("")
-def read_settings(db: Session = Depends(get_db)):
-    return ensure_settings(db)
+def read_settings(user_id: int | None = None, db: Session = Depends(get_db)):
+    # Without user_id, the defaults every account without an override follows.
+    # An account's settings come back with user_id NULL while it has no override.
+    _check_account(db, user_id)
+    return ensure_settings(db, user_id)
 
 
 @router.post("")
-def update_settings(payload: dict, db: Session = Depends(get_db)):
-    settings = ensure_settings(db)
+def update_settings(payload: dict, user_id: int | None = None, db: Session = Depends(get_db)):
+    # With user_id this saves (or updates) that account's override.
+    _check_account(db, user_id)
+    settings = override_settings(db, user_id) if user_id is not None else ensure_settings(db)
     for key, value in payload.items():
-        if hasattr(settings, key):
+        if key in SETTINGS_FIELDS:
             setattr(settings, key, value)
     db.commit()
     db.refresh(settings)
     return settings
+
+
+@router.delete("")
+def reset_settings(user_id: int, db: Session = Depends(get_db)):
+    # Drops the account's override; it follows the defaults again.
+    _check_account(db, user_id)
+    db.query(Settings).filter(Settings.user_id == user_id).delete(synchronize_session=False)
+    db.commit()
+    return ensure_settings(db, user_id)
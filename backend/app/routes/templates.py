@@ -1,142 +1,30 @@
 import json
 import os
-import uuid
-from typing import List, Optional
+from typing import Tuple
 
 from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 from ..db import get_db
 from ..models import EmailTemplate, TemplateAttachment
 from ..auth_google import current_user, load_credentials
 from ..gmail_client import GmailClient
-
-UPLOAD_ROOT = os.environ.get("UPLOAD_ROOT", "uploads")
-IMAGE_DIR = os.path.join(UPLOAD_ROOT, "images")
-ATTACH_DIR = os.path.join(UPLOAD_ROOT, "attachments")
-
-os.makedirs(IMAGE_DIR, exist_ok=True)
-os.makedirs(ATTACH_DIR, exist_ok=True)
+from ..services.blocks import GMAIL_CLIP_BYTES, blocks_have_unsubscribe, blocks_to_text, render_email
+from ..services.templating import compile_template
+from ..services.uploads import (
+    ATTACH_DIR,
+    ATTACHMENT_LIMIT,
+    IMAGE_DIR,
+    IMAGE_LIMIT,
+    UPLOAD_ROOT,
+    UploadTooLarge,
+    store_upload,
+)
 
 router = APIRouter(prefix="/templates", tags=["templates"])
 
 
-def _blocks_have_unsubscribe(blocks: List[dict]) -> bool:
-    for block in blocks:
-        if block.get("type") == "signature":
-            content = json.dumps(block.get("props", {}))
-            if "unsubscribe_url" in content:
-                return True
-        if block.get("type") == "text":
-            content = json.dumps(block.get("props", {}))
-            if "unsubscribe_url" in content:
-                return True
-    return False
-
-
-def _render_block_html(block: dict) -> str:
-    btype = block.get("type")
-    props = block.get("props", {})
-    padding = props.get("padding", 12)
-    align = props.get("align", "left")
-    if btype == "text":
-        color = props.get("color", "#111827")
-        size = props.get("size", 16)
-        body = props.get("text", "")
-        return f"""
-        <tr>
-          <td style="padding:{padding}px; text-align:{align}; color:{color}; font-size:{size}px; line-height:1.5; font-family: Inter, -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif;">
-            {body}
-          </td>
-        </tr>
-        """
-    if btype == "image":
-        src = props.get("src", "")
-        alt = props.get("alt", "")
-        width = props.get("width", 560)
-        return f"""
-        <tr>
-          <td style="padding:{padding}px; text-align:{align};">
-            <img src="{src}" alt="{alt}" width="{width}" style="max-width:100%; height:auto; display:block; margin:0 auto;" />
-          </td>
-        </tr>
-        """
-    if btype == "button":
-        label = props.get("text", "Action")
-        url = props.get("url", "#")
-        style = props.get("style", "primary")
-        bg = "#6366F1" if style == "primary" else ("#111827" if style == "outline" else "#374151")
-        color = "#ffffff" if style != "outline" else "#e5e7eb"
-        border = "1px solid #6366F1" if style == "outline" else "none"
-        return f"""
-        <tr>
-          <td style="padding:{padding}px; text-align:{align};">
-            <a href="{url}" style="background:{bg}; color:{color}; text-decoration:none; padding:12px 20px; border-radius:8px; border:{border}; display:inline-block; font-weight:600; font-family: Inter, -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif;">
-              {label}
-            </a>
-          </td>
-        </tr>
-        """
-    if btype == "divider":
-        return f"""
-        <tr>
-          <td style="padding:{padding}px;">
-            <div style="border-bottom:1px solid #e5e7eb; width:100%;"></div>
-          </td>
-        </tr>
-        """
-    if btype == "spacer":
-        height = props.get("height", 24)
-        return f"""
-        <tr><td style="padding:{padding}px 0; height:{height}px;"></td></tr>
-        """
-    if btype == "signature":
-        text = props.get("text", "You are receiving this email because you opted in. If you'd like to stop, click {{unsubscribe_url}}.")
-        color = props.get("color", "#6B7280")
-        return f"""
-        <tr>
-          <td style="padding:{padding}px; font-size:13px; color:{color}; text-align:{align}; line-height:1.6; font-family: Inter, -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif;">
-            {text}
-          </td>
-        </tr>
-        """
-    return ""
-
-
-def _render_email(blocks: List[dict], global_styles: Optional[dict] = None) -> str:
-    global_styles = global_styles or {}
-    bg = global_styles.get("background", "#f7f8fa")
-    font = global_styles.get("font", "Inter, -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif")
-    padding = global_styles.get("padding", 24)
-    rendered_blocks = "".join(_render_block_html(b) for b in blocks)
-    return f"""
-    <html>
-      <body style="margin:0; padding:0; background:{bg}; font-family:{font};">
-        <table role='presentation' cellspacing='0' cellpadding='0' border='0' width='100%'>
-          <tr>
-            <td align='center' style="padding:{padding}px 0;">
-              <table role='presentation' cellspacing='0' cellpadding='0' border='0' width='600' style="background:#ffffff; border:1px solid #e5e7eb; border-radius:12px;">
-                {rendered_blocks}
-              </table>
-            </td>
-          </tr>
-        </table>
-      </body>
-    </html>
-    """
-
-
-def _blocks_to_text(blocks: List[dict]) -> str:
-    parts: List[str] = []
-    for b in blocks:
-        props = b.get("props", {})
-        if b.get("type") in {"text", "signature"}:
-            parts.append(props.get("text", ""))
-        if b.get("type") == "button":
-            parts.append(f"{props.get('text', 'Action')} -> {props.get('url', '#')}")
-    return "\n\n".join([p for p in parts if p])
-
-
 @router.get("")
 def list_templates(db: Session = Depends(get_db)):
     templates = db.query(EmailTemplate).order_by(EmailTemplate.updated_at.desc()).all()
@@ -145,6 +33,27 @@ def list_templates(db: Session = Depends(get_db)):
     ]
 
 
+@router.post("/preview")
+def preview_template(payload: dict):
+    # Called by the editor as the user types; nothing is stored. ``values`` fills
+    # placeholders (e.g. {"first_name": "Ada"}) the way a send would.
+    blocks = payload.get("blocks") or []
+    html = render_email(blocks, payload.get("global", {}))
+    text_version = blocks_to_text(blocks)
+    values = payload.get("values")
+    if values:
+        html = compile_template(html).render(values)
+        text_version = compile_template(text_version, escape=False).render(values)
+    size = len(html.encode())
+    return {
+        "html": html,
+        "text": text_version,
+        "size": size,
+        "clipped": size > GMAIL_CLIP_BYTES,
+        "has_unsubscribe": blocks_have_unsubscribe(blocks),
+    }
+
+
 @router.get("/{template_id}")
 def get_template(template_id: int, db: Session = Depends(get_db)):
     template = db.query(EmailTemplate).filter(EmailTemplate.id == template_id).first()
@@ -174,11 +83,11 @@ def save_template(payload: dict, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Name is required")
     if not blocks:
         raise HTTPException(status_code=400, detail="At least one block is required")
-    if not _blocks_have_unsubscribe(blocks):
+    if not blocks_have_unsubscribe(blocks):
         raise HTTPException(status_code=400, detail="Unsubscribe footer with {{unsubscribe_url}} is required")
 
-    html = _render_email(blocks, global_styles)
-    text_version = _blocks_to_text(blocks)
+    html = render_email(blocks, global_styles)
+    text_version = blocks_to_text(blocks)
 
     template_id = payload.get("id")
     if template_id:
@@ -214,32 +123,27 @@ def save_template(payload: dict, db: Session = Depends(get_db)):
     return {"id": template.id, "html": html, "text": text_version}
 
 
+async def _store(file: UploadFile, directory: str, limit: int, too_large: str) -> Tuple[str, int]:
+    # The multipart body is already spooled by Starlette; its size is known up front,
+    # and the copy/hash runs off the event loop.
+    if file.size is not None and file.size > limit:
+        raise HTTPException(status_code=400, detail=too_large)
+    try:
+        return await run_in_threadpool(store_upload, file.file, directory, file.filename, limit)
+    except UploadTooLarge:
+        raise HTTPException(status_code=400, detail=too_large)
+
+
 @router.post("/upload/image")
 async def upload_image(file: UploadFile = File(...)):
-    ext = os.path.splitext(file.filename)[1]
-    safe_name = f"img-{uuid.uuid4().hex}{ext}"
-    path = os.path.join(IMAGE_DIR, safe_name)
-    content = await file.read()
-    if len(content) > 5 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="Image too large (5MB max)")
-    with open(path, "wb") as f:
-        f.write(content)
-    url = f"/uploads/images/{safe_name}"
-    return {"url": url, "filename": file.filename, "size": len(content)}
+    name, size = await _store(file, IMAGE_DIR, IMAGE_LIMIT, "Image too large (5MB max)")
+    return {"url": f"/uploads/images/{name}", "filename": file.filename, "size": size}
 
 
 @router.post("/upload/attachment")
 async def upload_attachment(file: UploadFile = File(...)):
-    ext = os.path.splitext(file.filename)[1]
-    safe_name = f"att-{uuid.uuid4().hex}{ext}"
-    path = os.path.join(ATTACH_DIR, safe_name)
-    content = await file.read()
-    if len(content) > 25 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="Attachment exceeds 25MB")
-    with open(path, "wb") as f:
-        f.write(content)
-    url = f"/uploads/attachments/{safe_name}"
-    return {"url": url, "filename": file.filename, "size": len(content)}
+    name, size = await _store(file, ATTACH_DIR, ATTACHMENT_LIMIT, "Attachment exceeds 25MB")
+    return {"url": f"/uploads/attachments/{name}", "filename": file.filename, "size": size}
 
 
 @router.post("/{template_id}/send-test")
@@ -251,7 +155,7 @@ def send_test_email(template_id: int, payload: dict, db: Session = Depends(get_d
     if not user:
         raise HTTPException(status_code=400, detail="Connect Gmail first")
     creds = load_credentials(user)
-    client = GmailClient(creds)
+    client = GmailClient(creds, account=user.email)
     to_email = payload.get("to") or user.email
     attach_payload = []
     for att in template.attachments:
@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 
 from ..db import get_db
 from ..models import Lead
+from ..services.segments import adjust_segments, is_eligible
 
 router = APIRouter(tags=["unsubscribe"])
 
@@ -12,6 +13,8 @@ def unsubscribe(token: str, db: Session = Depends(get_db)):
     lead = db.query(Lead).filter(Lead.unsubscribe_token == token).first()
     if not lead:
         raise HTTPException(status_code=404, detail="Token not found")
+    if is_eligible(lead):
+        adjust_segments(db, lead.id, -1)
     lead.unsubscribed = True
     db.commit()
     return {"status": "unsubscribed", "email": lead.email}
@@ -0,0 +1,70 @@
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class Row(BaseModel):
+    # Built from column projections (SQLAlchemy rows), not ORM instances.
+    model_config = ConfigDict(from_attributes=True)
+
+
+class LeadOut(Row):
+    id: int
+    email: str
+    consent: Optional[bool] = None
+    unsubscribed: Optional[bool] = None
+    first_name: Optional[str] = None
+    company: Optional[str] = None
+    country: Optional[str] = None
+    custom_fields: Optional[dict] = None
+    created_at: Optional[datetime] = None
+
+
+class QueueItemOut(Row):
+    id: int
+    lead_id: Optional[int] = None
+    campaign_id: Optional[int] = None
+    user_id: Optional[int] = None
+    step: str
+    scheduled_at: datetime
+    status: Optional[str] = None
+    attempts: int = 0
+    last_error: Optional[str] = None
+
+
+class LogOut(Row):
+    id: int
+    lead_id: Optional[int] = None
+    campaign_id: Optional[int] = None
+    step: str
+    status: str
+    scheduled_at: Optional[datetime] = None
+    sent_at: Optional[datetime] = None
+    message_id: Optional[str] = None
+    thread_id: Optional[str] = None
+    error: Optional[str] = None
+
+
+class LeadPage(BaseModel):
+    items: List[LeadOut]
+    next_cursor: Optional[str] = None
+
+
+class QueuePage(BaseModel):
+    items: List[QueueItemOut]
+    next_cursor: Optional[str] = None
+
+
+class LogPage(BaseModel):
+    items: List[LogOut]
+    next_cursor: Optional[str] = None
+
+
+class ForecastIn(BaseModel):
+    user_id: Optional[int] = None
+    segment_id: Optional[int] = None
+    lead_count: Optional[int] = Field(None, ge=0)
+    delay_days: int = Field(3, ge=0)
+    reply_rate: float = Field(0.0, ge=0, le=1)
+    settings: Optional[dict] = None
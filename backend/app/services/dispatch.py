@@ -0,0 +1,197 @@
+import heapq
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+
+from ..auth_google import list_accounts, load_credentials
+from ..db import SessionLocal
+from ..gmail_client import GmailClient
+from ..metrics import record_error, tick_items, tick_seconds
+from ..models import ScheduledSend, User
+from .sender import WORKER_ID, default_account_id, lane_filter, on_queued, process_queue
+
+logger = logging.getLogger("mailer.dispatch")
+
+# The dispatcher re-reads every lane's next due time this often, to pick up items
+# queued by other processes. It is also the retry delay for a lane that still has
+# due items after a run (daily cap reached, items leased elsewhere).
+RESYNC_SECONDS = int(os.environ.get("DISPATCH_RESYNC_SECONDS", "60"))
+MAX_LANES = int(os.environ.get("DISPATCH_MAX_LANES", "16"))
+
+
+class Lane:
+    # One per connected account: its own Gmail client and cached credentials,
+    # drained serially so the account's pacing holds, concurrently with other lanes.
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.lock = threading.Lock()
+        self.client: Optional[GmailClient] = None
+
+    def client_for(self, user: User) -> GmailClient:
+        credentials = load_credentials(user)
+        if self.client is None or self.client.credentials is not credentials:
+            self.client = GmailClient(credentials, account=user.email)
+        return self.client
+
+
+_lanes: Dict[int, Lane] = {}
+_lanes_lock = threading.Lock()
+
+
+def _lane(user_id: int) -> Lane:
+    with _lanes_lock:
+        lane = _lanes.get(user_id)
+        if lane is None:
+            lane = _lanes[user_id] = Lane(user_id)
+        return lane
+
+
+def run_lane(user_id: int, owner: str = WORKER_ID) -> Tuple[datetime, bool]:
+    # Returns when the run started and whether process_queue held due items back.
+    started = datetime.utcnow()
+    lane = _lane(user_id)
+    if not lane.lock.acquire(blocking=False):
+        return started, False  # the previous tick is still draining this account
+    db = SessionLocal()
+    try:
+        user = db.get(User, user_id)
+        if not user:
+            return started, False
+        with tick_seconds.time():
+            handled, held = process_queue(db, user=user, owner=f"{owner}:{user_id}", client=lane.client_for(user))
+        tick_items.observe(handled)
+        return started, held
+    finally:
+        db.close()
+        lane.lock.release()
+
+
+def next_due(user_id: int) -> Optional[datetime]:
+    db = SessionLocal()
+    try:
+        lane = lane_filter(ScheduledSend.user_id, user_id, default_account_id(db))
+        return (
+            db.query(func.min(ScheduledSend.scheduled_at))
+            .filter(ScheduledSend.status == "queued", lane)
+            .scalar()
+        )
+    finally:
+        db.close()
+
+
+class Dispatcher:
+    # Sleeps until the earliest scheduled_at across lanes instead of polling.
+    # The heap holds (due, user_id) per lane, with stale entries skipped lazily;
+    # sender.on_queued pushes earlier times as items are queued, and a lane's
+    # next due time is re-read from the database after each of its runs.
+    def __init__(self, owner: str = WORKER_ID, resync_seconds: int = RESYNC_SECONDS, max_lanes: int = MAX_LANES):
+        self.owner = owner
+        self.resync_seconds = resync_seconds
+        self.max_lanes = max_lanes
+        self._heap: List[Tuple[datetime, int]] = []
+        self._cond = threading.Condition()
+        self._resync_at = datetime.min
+        self._running: Set[int] = set()
+        self._stopping = False
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._pool = ThreadPoolExecutor(max_workers=self.max_lanes, thread_name_prefix="lane")
+        on_queued(self.notify)
+        self._thread = threading.Thread(target=self._loop, name="dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait: bool = True):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join()
+        if self._pool:
+            self._pool.shutdown(wait=wait)
+
+    def notify(self, when: datetime, user_id: Optional[int] = None):
+        with self._cond:
+            if user_id is None:
+                self._resync_at = datetime.min
+            else:
+                heapq.heappush(self._heap, (when, user_id))
+            self._cond.notify()
+
+    def _resync(self):
+        db = SessionLocal()
+        try:
+            user_ids = [user.id for user in list_accounts(db)]
+        finally:
+            db.close()
+        with _lanes_lock:
+            for stale in set(_lanes) - set(user_ids):
+                del _lanes[stale]
+        heap = [(due, user_id) for user_id in user_ids if (due := next_due(user_id)) is not None]
+        heapq.heapify(heap)
+        with self._cond:
+            self._heap = heap
+            self._resync_at = datetime.utcnow() + timedelta(seconds=self.resync_seconds)
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return
+                resync = datetime.utcnow() >= self._resync_at
+            if resync:
+                try:
+                    self._resync()
+                except Exception as exc:
+                    record_error("dispatcher", exc)
+                    logger.exception("dispatcher resync failed")
+                    with self._cond:
+                        self._resync_at = datetime.utcnow() + timedelta(seconds=self.resync_seconds)
+            with self._cond:
+                now = datetime.utcnow()
+                due: Set[int] = set()
+                while self._heap and self._heap[0][0] <= now:
+                    due.add(heapq.heappop(self._heap)[1])
+                due -= self._running
+                self._running |= due
+                if not due and not self._stopping:
+                    wake = min(self._heap[0][0], self._resync_at) if self._heap else self._resync_at
+                    self._cond.wait(max(0.0, (wake - now).total_seconds()))
+            for user_id in due:
+                future = self._pool.submit(run_lane, user_id, self.owner)
+                future.add_done_callback(lambda f, user_id=user_id: self._finished(user_id, f))
+
+    def _finished(self, user_id: int, future: Future):
+        if future.exception():
+            record_error("lane", future.exception())
+            logger.error("lane %s failed", user_id, exc_info=future.exception())
+            started, held = datetime.utcnow(), True
+        else:
+            started, held = future.result()
+        try:
+            due = next_due(user_id)
+        except Exception as exc:
+            record_error("dispatcher", exc)
+            due = None
+        now = datetime.utcnow()
+        with self._cond:
+            self._running.discard(user_id)
+            if due is not None:
+                if held or due <= started:
+                    # Left behind by the run (capped, throttled, leased elsewhere),
+                    # not something that came due while it was sending.
+                    due = max(due, now + timedelta(seconds=self.resync_seconds))
+                heapq.heappush(self._heap, (due, user_id))
+            self._cond.notify()
+
+
+dispatcher = Dispatcher()
@@ -0,0 +1,105 @@
+import heapq
+from collections import deque
+from typing import Deque, Dict, Hashable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Decides which campaign gets each of an account's pacing slots. A higher
+# priority always goes first; campaigns of equal priority share slots in
+# proportion to their weight (stride scheduling: each pick advances the
+# campaign's pass by STRIDE / weight, and the lowest pass goes next). Only the
+# order changes, so the account's pacing and daily cap are untouched.
+STRIDE = 1 << 20
+
+
+class FairShare:
+    def __init__(self):
+        self._heap: List[Tuple[int, float, int, Hashable, float]] = []
+        self._added = 0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def add(self, key: Hashable, priority: int = 0, weight: int = 1):
+        stride = STRIDE / max(1, weight or 1)
+        # Ties go to the campaign added first.
+        heapq.heappush(self._heap, (-(priority or 0), stride, self._added, key, stride))
+        self._added += 1
+
+    def take(self) -> Hashable:
+        # The campaign owed the next slot, charged for it.
+        priority, pass_, added, key, stride = self._heap[0]
+        heapq.heapreplace(self._heap, (priority, pass_ + stride, added, key, stride))
+        return key
+
+    def drop(self, key: Hashable):
+        # ``key`` has nothing left to send.
+        self._heap = [entry for entry in self._heap if entry[3] != key]
+        heapq.heapify(self._heap)
+
+
+def share_slots(
+    pending: Sequence[Tuple[Hashable, object]],
+    policy: Dict[Hashable, Tuple[int, int]],
+    key: Hashable,
+    priority: int,
+    weight: int,
+    items: Iterable,
+) -> Iterator[Tuple[Optional[int], Hashable, object]]:
+    # Slots a new campaign ``key`` in among ``pending``, the (campaign, item)
+    # pairs holding an account's earliest pending slots, in slot order. Yields
+    # (slot, campaign, item) for every new item and every pending item that
+    # moves: ``slot`` indexes ``pending``, or is None for the next slot after
+    # the account's queue. Once the new campaign runs out, pending items keep
+    # their slots; the ones it displaced fill the slots left empty behind it,
+    # then go after the queue. Everything past ``pending`` is left alone.
+    queues: Dict[Hashable, Deque[int]] = {}
+    for position, (owner, _) in enumerate(pending):
+        queues.setdefault(owner, deque()).append(position)
+    fair = FairShare()
+    for owner in queues:
+        fair.add(owner, *policy.get(owner, (0, 1)))
+    fair.add(key, priority, weight)
+    items = iter(items)
+    slot = 0
+    while slot < len(pending):
+        owner = fair.take()
+        if owner == key:
+            item = next(items, None)
+            if item is None:
+                break
+            yield slot, key, item
+        else:
+            if not queues[owner]:
+                fair.drop(owner)
+                continue
+            position = queues[owner].popleft()
+            if position != slot:
+                yield slot, owner, pending[position][1]
+        slot += 1
+    else:
+        # Past the window everything left goes after the queue, still shared.
+        while len(fair) > 1:
+            owner = fair.take()
+            if owner == key:
+                item = next(items, None)
+                if item is None:
+                    fair.drop(key)
+                    continue
+                yield None, key, item
+            elif queues[owner]:
+                yield None, owner, pending[queues[owner].popleft()][1]
+            else:
+                fair.drop(owner)
+        if fair and fair.take() == key:
+            for item in items:
+                yield None, key, item
+        for owner, queue in queues.items():
+            for position in queue:
+                yield None, owner, pending[position][1]
+        return
+
+    left = sorted(position for queue in queues.values() for position in queue)
+    kept = {position for position in left if position >= slot}
+    empty = (position for position in range(slot, len(pending)) if position not in kept)
+    for position in left:
+        if position < slot:
+            yield next(empty, None), pending[position][0], pending[position][1]
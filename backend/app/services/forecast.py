@@ -0,0 +1,121 @@
+import math
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..models import ScheduledSend, Settings
+from .sender import SETTINGS_FIELDS, _lane_tail, _next_window, _window, default_account_id, eligible_leads, lane_filter
+
+MAX_DAYS = 366
+
+
+def _minutes(value) -> float:
+    return value.hour * 60 + value.minute + value.second / 60
+
+
+def read_settings(db: Session, user_id: Optional[int], overrides: Optional[dict] = None) -> Settings:
+    # Like ensure_settings, but never writes: falls back to the defaults row, then
+    # to the column defaults. ``overrides`` lets a caller ask "what if".
+    stored = db.query(Settings).filter(Settings.user_id == user_id).first()
+    if stored is None and user_id is not None:
+        stored = db.query(Settings).filter(Settings.user_id.is_(None)).first()
+    values = {
+        field: getattr(stored, field) if stored is not None else Settings.__table__.c[field].default.arg
+        for field in SETTINGS_FIELDS
+    }
+    values.update({field: value for field, value in (overrides or {}).items() if field in SETTINGS_FIELDS and value is not None})
+    return Settings(user_id=user_id, **values)
+
+
+def forecast(
+    db: Session,
+    user_id: Optional[int] = None,
+    lead_count: Optional[int] = None,
+    delay_days: int = 3,
+    reply_rate: float = 0.0,
+    overrides: Optional[dict] = None,
+    max_days: int = MAX_DAYS,
+) -> dict:
+    # Where schedule_campaign would put a new campaign, in closed form: pacing_slots
+    # advances by interval_min..interval_max minutes (the mean is used here) inside
+    # the window, at most daily_cap a day, continuing after the account's queue.
+    # Fair-share slotting can only move a campaign's sends earlier than that, so
+    # completes_at is an upper bound. Reads only.
+    default_id = default_account_id(db)
+    user_id = user_id or default_id
+    settings = read_settings(db, user_id, overrides)
+    if settings.daily_cap < 1 or settings.interval_min < 0 or settings.interval_max < settings.interval_min:
+        raise ValueError("daily_cap must be positive and interval_min <= interval_max")
+    tz, start_t, end_t = _window(settings)
+    gap = (settings.interval_min + settings.interval_max) / 2
+    lane = lane_filter(ScheduledSend.user_id, user_id, default_id)
+    if lead_count is None:
+        lead_count = eligible_leads(db).count()
+    if lead_count < 0 or delay_days < 0:
+        raise ValueError("lead_count and delay_days must not be negative")
+    queued_ahead = (
+        db.query(func.count(ScheduledSend.id))
+        .filter(ScheduledSend.step == "mail1", ScheduledSend.status == "queued", lane)
+        .scalar()
+    )
+
+    base, booked = _lane_tail(db, settings, lane, gap_minutes=gap)
+    first = _next_window(base, start_t, end_t, tz)
+    if first.date() != base.astimezone(tz).date():
+        booked = 0
+    elif booked >= settings.daily_cap:
+        first = tz.localize(datetime.combine(first.date() + timedelta(days=1), start_t))
+        booked = 0
+
+    window = max(0.0, _minutes(end_t) - _minutes(start_t))
+    per_window = math.inf if gap == 0 else math.floor(window / gap) + 1
+    full_day = int(min(settings.daily_cap, per_window))
+    first_day = int(min(settings.daily_cap - booked, math.inf if gap == 0 else math.floor((_minutes(end_t) - _minutes(first)) / gap) + 1))
+    first_day = max(0, min(first_day, lead_count))
+
+    remaining = lead_count - first_day
+    if remaining <= 0:
+        extra_days, last_day = 0, first_day
+    else:
+        extra_days = math.ceil(remaining / full_day) if full_day else 0
+        last_day = remaining - (extra_days - 1) * full_day if full_day else 0
+    start_day = first.date()
+    last_date = start_day + timedelta(days=extra_days)
+    if lead_count == 0:
+        completes_at = None
+    elif extra_days == 0:
+        completes_at = first + timedelta(minutes=gap * (last_day - 1))
+    else:
+        completes_at = tz.localize(datetime.combine(last_date, start_t)) + timedelta(minutes=gap * (last_day - 1))
+
+    def mail1_on(index: int) -> int:
+        if index < 0 or index > extra_days or lead_count == 0:
+            return 0
+        if index == 0:
+            return first_day
+        return last_day if index == extra_days else full_day
+
+    follow_up = 1 - min(max(reply_rate, 0.0), 1.0)
+    horizon = extra_days + delay_days + 1
+    daily: List[dict] = []
+    for index in range(min(horizon, max_days)):
+        mail1 = mail1_on(index)
+        mail2 = round(mail1_on(index - delay_days) * follow_up)
+        if mail1 or mail2:
+            daily.append({"day": (start_day + timedelta(days=index)).isoformat(), "mail1": mail1, "mail2": mail2})
+
+    return {
+        "account_id": user_id,
+        "leads": lead_count,
+        "queued_ahead": queued_ahead,
+        "daily_capacity": full_day,
+        "starts_at": first.isoformat() if lead_count else None,
+        "completes_at": completes_at.isoformat() if completes_at else None,
+        "last_follow_up_at": (completes_at + timedelta(days=delay_days)).isoformat() if completes_at else None,
+        "send_days": extra_days + 1 if lead_count else 0,
+        "mail2_total": round(lead_count * follow_up),
+        "daily": daily,
+        "truncated": horizon > max_days,
+    }
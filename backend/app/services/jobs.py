@@ -0,0 +1,49 @@
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy.orm import Session
+
+from ..db import SessionLocal
+from ..models import Job
+
+
+def create_job(db: Session, kind: str, total: int | None = None) -> Job:
+    job = Job(kind=kind, total=total)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def run_job(job_id: str, work: Callable[[Session, Job], None]):
+    db = SessionLocal()
+    try:
+        job = db.get(Job, job_id)
+        job.status = "running"
+        db.commit()
+        try:
+            work(db, job)
+            job.status = "done"
+        except Exception as exc:
+            db.rollback()
+            job = db.get(Job, job_id)
+            job.status = "failed"
+            job.error = str(exc)
+        job.finished_at = datetime.utcnow()
+        db.commit()
+    finally:
+        db.close()
+
+
+def job_payload(job: Job) -> dict:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "total": job.total,
+        "processed": job.processed,
+        "rejected": job.rejected,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
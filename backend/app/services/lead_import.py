@@ -0,0 +1,174 @@
+import csv
+import json
+import os
+import secrets
+import shutil
+import tempfile
+from typing import BinaryIO, Dict, Iterator, List, Tuple
+
+from sqlalchemy import false, func, insert
+from sqlalchemy.orm import Session
+
+from ..models import Job, JobRejection, Lead
+from .segments import invalidate_segments
+
+CHUNK_SIZE = 1024 * 1024
+BATCH_SIZE = 5000
+REQUIRED_COLUMNS = {"email", "consent"}
+# Indexed lead columns for segment filters; only updated when the CSV has them.
+PROMOTED_COLUMNS = ("company", "country")
+KNOWN_COLUMNS = REQUIRED_COLUMNS | {"first_name"} | set(PROMOTED_COLUMNS)
+TRUTHY = {"true", "1", "yes"}
+
+
+class LeadImportError(ValueError):
+    pass
+
+
+def spool_upload(source: BinaryIO) -> str:
+    fd, path = tempfile.mkstemp(prefix="leads-", suffix=".csv")
+    with os.fdopen(fd, "wb") as target:
+        shutil.copyfileobj(source, target, CHUNK_SIZE)
+    return path
+
+
+def _open_csv(path: str):
+    handle = open(path, "r", newline="", encoding="utf-8-sig", buffering=CHUNK_SIZE)
+    reader = csv.reader(handle)
+    header = [h.strip().lower() for h in next(reader, [])]
+    return handle, reader, header
+
+
+def check_header(path: str):
+    try:
+        handle, _, header = _open_csv(path)
+    except UnicodeDecodeError:
+        raise LeadImportError("CSV must be UTF-8 encoded")
+    handle.close()
+    if not REQUIRED_COLUMNS.issubset(header):
+        raise LeadImportError("CSV must include email and consent columns")
+
+
+def count_rows(path: str) -> int:
+    # Lines after the header: the job's total for progress. Quoted newlines and
+    # blank lines make it an estimate, corrected when the import finishes.
+    lines = 0
+    last = b"\n"
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(CHUNK_SIZE), b""):
+            lines += chunk.count(b"\n")
+            last = chunk[-1:]
+    return max(0, lines + (last != b"\n") - 1)
+
+
+def _batches(reader, header: List[str]) -> Iterator[Tuple[List[dict], List[dict], int]]:
+    email_idx = header.index("email")
+    consent_idx = header.index("consent")
+    name_idx = header.index("first_name") if "first_name" in header else None
+    promoted = [(header.index(name), name) for name in PROMOTED_COLUMNS if name in header]
+    # Any other column becomes a custom field on the lead.
+    extra = [(idx, name) for idx, name in enumerate(header) if name and name not in KNOWN_COLUMNS]
+    width = len(header)
+    rows: Dict[str, dict] = {}
+    rejections: List[dict] = []
+    seen = 0
+    # Row numbers are 1-based data rows, the header being row 0.
+    for row_number, row in enumerate(reader, start=1):
+        if len(row) < width:
+            if not any(row):
+                continue
+            row = row + [""] * (width - len(row))
+        seen += 1
+        email = row[email_idx].strip().lower()
+        if not email or "@" not in email:
+            rejections.append({"row_number": row_number, "reason": "invalid_email", "value": row[email_idx]})
+        else:
+            first_name = row[name_idx].strip() if name_idx is not None else None
+            # Last occurrence of an email within a batch wins, as with sequential updates.
+            rows[email] = lead = {
+                "email": email,
+                "consent": row[consent_idx].strip().lower() in TRUTHY,
+                "first_name": first_name or None,
+                # At least the entropy of the model's uuid4 default, far cheaper to generate in bulk.
+                "unsubscribe_token": secrets.token_hex(16),
+            }
+            for idx, name in promoted:
+                lead[name] = row[idx].strip() or None
+            if extra:
+                lead["custom_fields"] = {name: row[idx].strip() for idx, name in extra if row[idx].strip()}
+        if seen >= BATCH_SIZE:
+            yield list(rows.values()), rejections, seen
+            rows, rejections, seen = {}, [], 0
+    if seen:
+        yield list(rows.values()), rejections, seen
+
+
+def _upsert_statement(db: Session, updated_columns: List[str]):
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return None
+    stmt = dialect_insert(Lead.__table__).values(created_at=func.current_timestamp(), unsubscribed=false())
+    updated = {name: stmt.excluded[name] for name in updated_columns}
+    return stmt.on_conflict_do_update(index_elements=[Lead.__table__.c.email], set_=updated)
+
+
+def _executemany(db: Session, stmt, rows: List[dict]):
+    # Rows are already plain driver types, so hand them straight to the DBAPI
+    # executemany instead of paying SQLAlchemy's per-row parameter processing.
+    conn = db.connection()
+    compiled = stmt.compile(dialect=conn.dialect, column_keys=list(rows[0]))
+    if compiled.positional:
+        names = compiled.positiontup
+        params = [tuple(row[name] for name in names) for row in rows]
+    else:
+        params = rows
+    conn.exec_driver_sql(compiled.string, params)
+
+
+def upsert_leads(db: Session, rows: List[dict]):
+    if not rows:
+        return
+    custom_fields = "custom_fields" in rows[0]
+    updated = [name for name in rows[0] if name not in ("email", "unsubscribe_token")]
+    stmt = _upsert_statement(db, updated)
+    if stmt is not None:
+        if custom_fields:
+            rows = [dict(r, custom_fields=json.dumps(r["custom_fields"])) for r in rows]
+        _executemany(db, stmt, rows)
+        return
+    existing = dict(db.query(Lead.email, Lead.id).filter(Lead.email.in_([r["email"] for r in rows])))
+    updates = [
+        dict({f: r[f] for f in updated}, id=existing[r["email"]]) for r in rows if r["email"] in existing
+    ]
+    inserts = [r for r in rows if r["email"] not in existing]
+    if updates:
+        db.bulk_update_mappings(Lead, updates)
+    if inserts:
+        db.connection().execute(insert(Lead.__table__), inserts)
+
+
+def import_leads(db: Session, job: Job, path: str):
+    handle, reader, header = _open_csv(path)
+    try:
+        job.total = count_rows(path)
+        db.commit()
+        for rows, rejections, seen in _batches(reader, header):
+            upsert_leads(db, rows)
+            invalidate_segments(db)
+            if rejections:
+                db.connection().execute(
+                    insert(JobRejection.__table__), [dict(r, job_id=job.id) for r in rejections]
+                )
+            job.processed += seen
+            job.rejected += len(rejections)
+            db.commit()
+        job.total = job.processed
+    except UnicodeDecodeError:
+        raise LeadImportError(f"CSV must be UTF-8 encoded (failed after row {job.processed})")
+    finally:
+        handle.close()
+        os.remove(path)
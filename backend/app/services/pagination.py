@@ -0,0 +1,125 @@
+import base64
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple, Type
+
+from fastapi import Response
+from pydantic import BaseModel
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query, Session
+
+from ..db import SessionLocal
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+EXPORT_CHUNK = 2000
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+class CursorError(ValueError):
+    pass
+
+
+def encode_cursor(values: Sequence) -> str:
+    plain = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(plain, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, order: Sequence) -> List:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if len(values) != len(order):
+            raise ValueError(cursor)
+        return [
+            datetime.fromisoformat(v) if column.type.python_type is datetime else v
+            for column, v in zip(order, values)
+        ]
+    except (ValueError, TypeError) as exc:
+        raise CursorError("Invalid cursor") from exc
+
+
+def _after(order: Sequence, values: Sequence, descending: bool):
+    # (a, b) > (x, y) spelled out as a > x OR (a = x AND b > y), which every
+    # backend can match against a composite index.
+    clauses = []
+    for i, column in enumerate(order):
+        step = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*[order[j] == values[j] for j in range(i)], step))
+    return or_(*clauses)
+
+
+def keyset_rows(query: Query, order: Sequence, after: Optional[Sequence], limit: int, descending: bool = False):
+    if after is not None:
+        query = query.filter(_after(order, after, descending))
+    keys = [c.desc() if descending else c for c in order]
+    return query.order_by(*keys).limit(limit).all()
+
+
+def keyset_page(
+    query: Query, order: Sequence, cursor: Optional[str], limit: int, descending: bool = False
+) -> Tuple[list, Optional[str]]:
+    after = decode_cursor(cursor, order) if cursor else None
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    rows = keyset_rows(query, order, after, limit + 1, descending)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(_key(rows[-1], order))
+    return rows, next_cursor
+
+
+def _key(row, order: Sequence) -> list:
+    return [getattr(row, column.key) for column in order]
+
+
+def json_response(page: BaseModel) -> Response:
+    # Serialised by pydantic-core straight to bytes, skipping FastAPI's
+    # jsonable_encoder pass over every item.
+    return Response(content=page.model_dump_json(), media_type="application/json")
+
+
+def export_rows(
+    build_query: Callable[[Session], Query],
+    order: Sequence,
+    schema: Type[BaseModel],
+    fmt: str,
+    descending: bool = False,
+) -> Iterator[bytes]:
+    # Walks the whole result set page by page with its own session so memory
+    # stays flat however many rows there are; meant for StreamingResponse.
+    fields = list(schema.model_fields)
+    db = SessionLocal()
+    try:
+        if fmt == "csv":
+            yield _csv_line(fields)
+        after = None
+        while True:
+            rows = keyset_rows(build_query(db), order, after, EXPORT_CHUNK, descending)
+            if not rows:
+                break
+            items = [schema.model_validate(row) for row in rows]
+            if fmt == "csv":
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                for item in items:
+                    writer.writerow([_csv_value(v) for v in item.model_dump(mode="json").values()])
+                yield buffer.getvalue().encode()
+            else:
+                yield b"".join(item.model_dump_json().encode() + b"\n" for item in items)
+            after = _key(rows[-1], order)
+    finally:
+        db.close()
+
+
+def _csv_line(values: list) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue().encode()
+
+
+def _csv_value(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return "" if value is None else value
@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+# Gmail charges per-user quota units per method (developers.google.com/gmail/api/reference/quota)
+# and allows 250 units/s per user as a moving average. Calls here are paced with one token
+# bucket per account so sends, reply checks and history sync share that budget instead of
+# bursting into 429s. The limit is per process: with N workers on one account, set
+# GMAIL_QUOTA_UNITS_PER_SECOND to 250 / N. 0 disables pacing.
+UNIT_COSTS = {
+    "messages.send": 100,
+    "threads.get": 10,
+    "messages.get": 5,
+    "history.list": 2,
+    "users.getProfile": 1,
+}
+DEFAULT_COST = 5
+QUOTA_UNITS_PER_SECOND = float(os.environ.get("GMAIL_QUOTA_UNITS_PER_SECOND", "250"))
+QUOTA_BURST_UNITS = float(os.environ.get("GMAIL_QUOTA_BURST_UNITS", str(QUOTA_UNITS_PER_SECOND)))
+
+
+def unit_cost(method: str) -> int:
+    return UNIT_COSTS.get(method, DEFAULT_COST)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def available(self) -> float:
+        with self.lock:
+            self._refill(self.clock())
+            return self.tokens
+
+    def reserve(self, cost: float) -> float:
+        # Takes ``cost`` tokens and returns how long the caller must wait before
+        # using them. Tokens can go negative, so a batch costing more than the
+        # bucket holds waits for the deficit instead of never fitting.
+        with self.lock:
+            now = self.clock()
+            self._refill(now)
+            need = min(cost, self.capacity)
+            wait = 0.0 if self.tokens >= need else (need - self.tokens) / self.rate
+            self.tokens -= cost
+            return wait
+
+    def drain(self, seconds: float):
+        # After a 429 nothing should go out for ``seconds``.
+        with self.lock:
+            self._refill(self.clock())
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class QuotaGovernor:
+    def __init__(
+        self,
+        rate: float = QUOTA_UNITS_PER_SECOND,
+        burst: float = QUOTA_BURST_UNITS,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def bucket(self, account: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(account)
+            if bucket is None:
+                bucket = self._buckets[account] = TokenBucket(self.rate, max(self.burst, 1), self.clock)
+            return bucket
+
+    def acquire(self, account: str, method: str, calls: int = 1) -> float:
+        # Blocks until ``calls`` requests of ``method`` fit the account's budget; returns the wait.
+        if not self.enabled:
+            return 0.0
+        wait = self.bucket(account).reserve(unit_cost(method) * calls)
+        if wait > 0:
+            self.sleep(wait)
+        return wait
+
+    def backoff(self, account: str, seconds: Optional[float]):
+        if self.enabled:
+            self.bucket(account).drain(seconds or 1.0)
+
+    def headroom(self, account: str, within: float = 0.0) -> Optional[float]:
+        # Units the account can spend now plus ``within`` seconds of refill; None when pacing is off.
+        if not self.enabled:
+            return None
+        return max(0.0, self.bucket(account).available() + within * self.rate)
+
+
+quota = QuotaGovernor()
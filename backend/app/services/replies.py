@@ -0,0 +1,133 @@
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import or_, true
+from sqlalchemy.orm import Session
+
+from ..gmail_client import HistoryExpired
+from ..models import Lead, MailboxSync, Reply, ScheduledSend, SendLog
+
+THREAD_CHUNK = 500
+
+
+def sync_replies(db: Session, client, account: str, user_id: Optional[int] = None) -> int:
+    state = db.query(MailboxSync).filter(MailboxSync.account == account).first()
+    if not state:
+        state = MailboxSync(account=account)
+        db.add(state)
+
+    marked = 0
+    if state.history_id:
+        try:
+            added, history_id = client.list_history(state.history_id)
+            marked = _mark_from_messages(db, client, added, user_id)
+        except HistoryExpired:
+            history_id = None
+    else:
+        history_id = None
+
+    if history_id is None:
+        # No usable cursor: take a fresh checkpoint first so nothing that arrives
+        # during the scan is lost, then check every thread still awaiting mail2.
+        history_id = client.current_history_id()
+        marked = _scan_pending_threads(db, client, user_id)
+
+    state.history_id = history_id
+    state.synced_at = datetime.utcnow()
+    db.commit()
+    return marked
+
+
+def _account(column, user_id: Optional[int]):
+    # Logs from before sends were attributed to an account (user_id NULL) are matched by any mailbox.
+    return or_(column == user_id, column.is_(None)) if user_id is not None else true()
+
+
+def _sent_threads(
+    db: Session, thread_ids: Iterable[str], user_id: Optional[int]
+) -> Dict[str, Tuple[int, int, datetime, str]]:
+    threads: Dict[str, Tuple[int, int, datetime, str]] = {}
+    thread_ids = list(thread_ids)
+    for start in range(0, len(thread_ids), THREAD_CHUNK):
+        rows = (
+            db.query(SendLog.thread_id, SendLog.lead_id, SendLog.campaign_id, SendLog.sent_at, Lead.email)
+            .join(Lead, Lead.id == SendLog.lead_id)
+            .filter(
+                SendLog.thread_id.in_(thread_ids[start : start + THREAD_CHUNK]),
+                SendLog.step == "mail1",
+                SendLog.status == "sent",
+                _account(SendLog.user_id, user_id),
+            )
+        )
+        for thread_id, lead_id, campaign_id, sent_at, email in rows:
+            threads[thread_id] = (lead_id, campaign_id, sent_at, email)
+    return threads
+
+
+def _mark_from_messages(db: Session, client, added: List[dict], user_id: Optional[int]) -> int:
+    if not added:
+        return 0
+    threads = _sent_threads(db, {m["threadId"] for m in added if m.get("threadId")}, user_id)
+    candidates = [m["id"] for m in added if m.get("threadId") in threads]
+    if not candidates:
+        return 0
+    return _mark(db, threads, client.message_senders(candidates))
+
+
+def _scan_pending_threads(db: Session, client, user_id: Optional[int]) -> int:
+    rows = (
+        db.query(SendLog.thread_id)
+        .join(
+            ScheduledSend,
+            (ScheduledSend.lead_id == SendLog.lead_id)
+            & (ScheduledSend.campaign_id == SendLog.campaign_id)
+            & (ScheduledSend.step == "mail2")
+            & (ScheduledSend.status == "queued"),
+        )
+        .outerjoin(Reply, (Reply.lead_id == SendLog.lead_id) & (Reply.campaign_id == SendLog.campaign_id))
+        .filter(
+            SendLog.step == "mail1",
+            SendLog.status == "sent",
+            SendLog.thread_id.isnot(None),
+            Reply.id.is_(None),
+            _account(SendLog.user_id, user_id),
+        )
+        .distinct()
+    )
+    thread_ids = [thread_id for (thread_id,) in rows]
+    if not thread_ids:
+        return 0
+    return _mark(db, _sent_threads(db, thread_ids, user_id), client.thread_senders(thread_ids))
+
+
+def _mark(db: Session, threads: Dict[str, Tuple[int, int, datetime, str]], messages: List[dict]) -> int:
+    # The first reply from the lead after mail1, per lead and campaign.
+    found: Dict[Tuple[int, int], dict] = {}
+    for message in messages:
+        thread = threads.get(message["threadId"])
+        if not thread:
+            continue
+        lead_id, campaign_id, sent_at, email = thread
+        if (lead_id, campaign_id) in found:
+            continue
+        if message["internal_date"] <= sent_at.replace(tzinfo=timezone.utc).timestamp() * 1000:
+            continue
+        if email.lower() not in message["from"].lower():
+            continue
+        found[(lead_id, campaign_id)] = message
+    if not found:
+        return 0
+    pairs = list(found)
+    for start in range(0, len(pairs), THREAD_CHUNK):
+        chunk = pairs[start : start + THREAD_CHUNK]
+        known = db.query(Reply.lead_id, Reply.campaign_id).filter(
+            Reply.lead_id.in_({lead_id for lead_id, _ in chunk}),
+            Reply.campaign_id.in_({campaign_id for _, campaign_id in chunk}),
+        )
+        for pair in known:
+            found.pop(tuple(pair), None)
+    db.add_all(
+        Reply(lead_id=lead_id, campaign_id=campaign_id, thread_id=message["threadId"], message_id=message["id"])
+        for (lead_id, campaign_id), message in found.items()
+    )
+    return len(found)
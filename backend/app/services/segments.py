@@ -0,0 +1,171 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import and_, not_, or_, select, update
+from sqlalchemy.orm import Session
+
+from ..models import Lead, Segment
+
+# Segment rules are JSON, compiled to a SQLAlchemy filter over leads:
+#   {"all": [rule, ...]}, {"any": [rule, ...]}, {"not": rule}
+#   {"field": "country", "op": "in", "value": ["DE", "AT"]}
+# Fields are the lead columns below or "custom.<name>" for an imported custom
+# field. company and country are indexed columns; custom fields are read out
+# of the JSON, so filtering on them scans every lead.
+FIELDS = {
+    "email": Lead.email,
+    "first_name": Lead.first_name,
+    "company": Lead.company,
+    "country": Lead.country,
+    "created_at": Lead.created_at,
+}
+CUSTOM_PREFIX = "custom."
+MAX_DEPTH = 10
+
+
+class SegmentError(ValueError):
+    pass
+
+
+def _column(field):
+    if not isinstance(field, str):
+        raise SegmentError("field must be a string")
+    if field in FIELDS:
+        return FIELDS[field]
+    if field.startswith(CUSTOM_PREFIX) and len(field) > len(CUSTOM_PREFIX):
+        return Lead.custom_fields[field[len(CUSTOM_PREFIX) :]].as_string()
+    raise SegmentError(f"unknown field {field!r}")
+
+
+def _value(column, value):
+    if isinstance(value, (list, dict)):
+        raise SegmentError("value must be a scalar")
+    if column is Lead.created_at:
+        try:
+            return datetime.fromisoformat(str(value))
+        except ValueError:
+            raise SegmentError("created_at values must be ISO dates")
+    return value if isinstance(value, str) else str(value)
+
+
+def _like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _condition(rule: dict):
+    column = _column(rule.get("field"))
+    op = rule.get("op", "eq")
+    value = rule.get("value")
+    if op == "exists":
+        return column.isnot(None)
+    if op == "missing":
+        return column.is_(None)
+    if op in ("in", "not_in"):
+        if not isinstance(value, list) or not value:
+            raise SegmentError(f"{op} needs a non-empty list")
+        values = [_value(column, v) for v in value]
+        return column.in_(values) if op == "in" else or_(column.is_(None), column.notin_(values))
+    if value is None:
+        raise SegmentError(f"{op} needs a value")
+    value = _value(column, value)
+    if op == "eq":
+        return column == value
+    if op == "ne":
+        return or_(column.is_(None), column != value)
+    if op in ("gt", "gte", "lt", "lte"):
+        return {"gt": column > value, "gte": column >= value, "lt": column < value, "lte": column <= value}[op]
+    if op in ("contains", "starts_with", "ends_with"):
+        if column is Lead.created_at:
+            raise SegmentError(f"{op} only applies to text fields")
+        pattern = {"contains": "%{}%", "starts_with": "{}%", "ends_with": "%{}"}[op].format(_like(value))
+        return column.ilike(pattern, escape="\\")
+    raise SegmentError(f"unknown op {op!r}")
+
+
+def compile_rules(rules, depth: int = 0):
+    if depth > MAX_DEPTH:
+        raise SegmentError("rules are nested too deeply")
+    if not isinstance(rules, dict):
+        raise SegmentError("a rule must be an object")
+    if "all" in rules or "any" in rules:
+        key = "all" if "all" in rules else "any"
+        children = rules[key]
+        if not isinstance(children, list) or not children:
+            raise SegmentError(f"{key} needs a non-empty list")
+        compiled = [compile_rules(child, depth + 1) for child in children]
+        return and_(*compiled) if key == "all" else or_(*compiled)
+    if "not" in rules:
+        return not_(compile_rules(rules["not"], depth + 1))
+    return _condition(rules)
+
+
+def segment_leads(db: Session, segment: Optional[Segment]):
+    # Eligible leads a campaign on ``segment`` targets; None means every eligible lead.
+    from .sender import eligible_leads
+
+    query = eligible_leads(db)
+    return query.filter(compile_rules(segment.rules)) if segment is not None else query
+
+
+def segment_count(db: Session, segment: Segment) -> int:
+    # Cached in segments.lead_count; a recount is only stored when nothing
+    # invalidated the segment while it ran.
+    if segment.lead_count is not None:
+        return segment.lead_count
+    revision = segment.revision
+    count = segment_leads(db, segment).count()
+    stored = db.execute(
+        update(Segment)
+        .where(Segment.id == segment.id, Segment.revision == revision)
+        .values(lead_count=count, counted_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    if stored.rowcount:
+        db.refresh(segment)
+    return count
+
+
+def invalidate_segments(db: Session):
+    # Lead attributes changed in bulk (an import): every cached count is stale.
+    # The caller commits.
+    db.execute(
+        update(Segment)
+        .where(Segment.lead_count.isnot(None))
+        .values(lead_count=None, revision=Segment.revision + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def adjust_segments(db: Session, lead_id: int, delta: int):
+    # A single lead became eligible (+1) or ineligible (-1). Its attributes did
+    # not change, so only the cached counts of segments it matches move. The
+    # caller commits.
+    cached = db.query(Segment.id, Segment.rules).filter(Segment.lead_count.isnot(None)).all()
+    matched = [
+        segment_id
+        for segment_id, rules in cached
+        if db.execute(select(Lead.id).where(Lead.id == lead_id, compile_rules(rules))).first()
+    ]
+    if matched:
+        db.execute(
+            update(Segment)
+            .where(Segment.id.in_(matched), Segment.lead_count.isnot(None))
+            .values(lead_count=Segment.lead_count + delta, revision=Segment.revision + 1)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def is_eligible(lead: Lead) -> bool:
+    return bool(lead.consent) and not lead.unsubscribed
+
+
+def segment_payload(db: Session, segment: Segment) -> dict:
+    return {
+        "id": segment.id,
+        "name": segment.name,
+        "rules": segment.rules,
+        "lead_count": segment_count(db, segment),
+        "counted_at": segment.counted_at,
+        "created_at": segment.created_at,
+    }
@@ -1,21 +1,69 @@
 import os
 import random
+import socket
+import threading
 from datetime import datetime, timedelta, time
-from typing import Dict, List
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
 
 import pytz
+from sqlalchemy import BigInteger, Integer, and_, bindparam, cast, func, insert, literal_column, or_, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from ..auth_google import current_user, load_credentials
 from ..gmail_client import GmailClient
-from ..models import Campaign, Lead, ScheduledSend, SendLog, Settings
+from ..metrics import record_error, send_failures_total
+from ..models import Campaign, Job, Lead, Reply, ScheduledSend, Segment, SendLog, Settings, User
+from .fair_share import share_slots
+from .replies import sync_replies
+from .quota import unit_cost
+from .segments import segment_count, segment_leads
+from .stats import record_logs, record_queued
+from .templating import lead_values, template_cache
 
 
-FOOTER_TEMPLATE = """<p style='margin-top:24px;font-size:12px;color:#666'>You are receiving this email because you have an existing relationship and opted in to communication. If you no longer wish to hear from us, click <a href=\"{unsubscribe_url}\">unsubscribe</a>.</p>"""
+DISPATCH_BATCH = 100
+LEASE_SECONDS = int(os.environ.get("QUEUE_LEASE_SECONDS", "300"))
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+SCHEDULE_CHUNK = 5000
+# How many of a lane's earliest pending mail1 slots a new campaign is shared
+# into; bounds the rows schedule_campaign reads and moves.
+FAIR_SHARE_WINDOW = int(os.environ.get("FAIR_SHARE_WINDOW", "10000"))
+# Failed sends back off exponentially (with jitter, never sooner than a Retry-After)
+# and move to the terminal "failed" status after MAX_SEND_ATTEMPTS or a permanent error.
+MAX_SEND_ATTEMPTS = int(os.environ.get("SEND_MAX_ATTEMPTS", "5"))
+RETRY_BASE_SECONDS = int(os.environ.get("SEND_RETRY_BASE_SECONDS", "60"))
+RETRY_MAX_SECONDS = int(os.environ.get("SEND_RETRY_MAX_SECONDS", str(6 * 3600)))
 
+FOOTER_TEMPLATE = """<p style='margin-top:24px;font-size:12px;color:#666'>You are receiving this email because you have an existing relationship and opted in to communication. If you no longer wish to hear from us, click <a href=\"{{unsubscribe_url}}\">unsubscribe</a>.</p>"""
 
-def ensure_settings(db: Session) -> Settings:
-    settings = db.query(Settings).first()
+
+# Called with (earliest scheduled_at, user_id) when items are queued, so an
+# in-process dispatcher can wake for them instead of waiting for its resync.
+_queued_listeners: List[Callable[[datetime, Optional[int]], None]] = []
+
+
+def on_queued(listener: Callable[[datetime, Optional[int]], None]):
+    if listener not in _queued_listeners:
+        _queued_listeners.append(listener)
+
+
+def _announce(when: datetime, user_id: Optional[int]):
+    for listener in _queued_listeners:
+        listener(when, user_id)
+
+
+SETTINGS_FIELDS = ("start_time", "end_time", "interval_min", "interval_max", "daily_cap", "timezone")
+
+
+def ensure_settings(db: Session, user_id: Optional[int] = None) -> Settings:
+    # An account uses its own row only once one is saved for it (override_settings);
+    # until then it reads the defaults row (user_id NULL), so edits to it apply live.
+    if user_id is not None:
+        settings = db.query(Settings).filter(Settings.user_id == user_id).first()
+        if settings:
+            return settings
+    settings = db.query(Settings).filter(Settings.user_id.is_(None)).first()
     if not settings:
         settings = Settings()
         db.add(settings)
@@ -24,6 +72,45 @@ def ensure_settings(db: Session) -> Settings:
     return settings
 
 
+def override_settings(db: Session, user_id: int) -> Settings:
+    # The account's own settings row, started from the defaults. The caller commits.
+    settings = db.query(Settings).filter(Settings.user_id == user_id).first()
+    if not settings:
+        defaults = ensure_settings(db)
+        settings = Settings(user_id=user_id, **{f: getattr(defaults, f) for f in SETTINGS_FIELDS})
+        db.add(settings)
+        try:
+            db.flush()
+        except IntegrityError:
+            # Another request saved the account's override first.
+            db.rollback()
+            return db.query(Settings).filter(Settings.user_id == user_id).one()
+    return settings
+
+
+def default_account_id(db: Session) -> Optional[int]:
+    user = current_user(db)
+    return user.id if user else None
+
+
+def lane_filter(column, user_id: Optional[int], default_id: Optional[int]):
+    # Rows written before accounts were assignable (user_id NULL) belong to the default account.
+    if user_id is not None and user_id == default_id:
+        return or_(column == user_id, column.is_(None))
+    return column == user_id if user_id is not None else column.is_(None)
+
+
+def _window(settings: Settings) -> Tuple[object, time, time]:
+    start_hour, start_min = map(int, settings.start_time.split(":"))
+    end_hour, end_min = map(int, settings.end_time.split(":"))
+    return pytz.timezone(settings.timezone), time(start_hour, start_min), time(end_hour, end_min)
+
+
+def _to_utc(value: datetime) -> datetime:
+    # Queue timestamps are stored as naive UTC, matching datetime.utcnow() in process_queue.
+    return value.astimezone(pytz.utc).replace(tzinfo=None)
+
+
 def _next_window(base: datetime, start: time, end: time, tz) -> datetime:
     localized = tz.localize(base.replace(tzinfo=None)) if base.tzinfo is None else base.astimezone(tz)
     day_start = localized.replace(hour=start.hour, minute=start.minute, second=0, microsecond=0)
@@ -35,163 +122,696 @@ def _next_window(base: datetime, start: time, end: time, tz) -> datetime:
     return localized
 
 
-def build_body(body_template: str, lead: Lead, unsubscribe_url: str) -> str:
-    vars_map: Dict[str, str] = {
-        "first_name": lead.first_name or "",
-        "email": lead.email,
-    }
-    content = body_template
-    for key, value in vars_map.items():
-        content = content.replace(f"{{{{{key}}}}}", value)
-    return content + FOOTER_TEMPLATE.format(unsubscribe_url=unsubscribe_url)
+def build_body(
+    body_template: str,
+    lead: Lead,
+    unsubscribe_url: str,
+    key: Tuple = (None, None),
+    values: Optional[dict] = None,
+) -> str:
+    # ``key`` is (campaign_id, step) so the compiled body is reused across sends.
+    template = template_cache.get(key + ("body",), body_template, suffix=FOOTER_TEMPLATE)
+    return template.render(values if values is not None else lead_values(lead, unsubscribe_url))
 
 
-def schedule_campaign(db: Session, campaign_id: int, leads: List[Lead]):
-    settings = ensure_settings(db)
+def build_subject(subject_template: str, values: dict, key: Tuple = (None, None)) -> str:
+    return template_cache.get(key + ("subject",), subject_template, escape=False).render(values)
+
+
+def _day_start(day, start: time, tz) -> datetime:
+    return tz.localize(datetime.combine(day, start))
+
+
+def pacing_slots(settings: Settings, base: datetime, daily_count: int = 0) -> Iterator[datetime]:
+    # Send times under the configured window, random interval and daily cap,
+    # starting at the first open window at or after ``base``. ``daily_count``
+    # is how many sends are already booked on base's day.
+    tz, start_t, end_t = _window(settings)
+    slot = _next_window(base, start_t, end_t, tz)
+    if slot.date() != base.astimezone(tz).date():
+        daily_count = 0
+    elif daily_count >= settings.daily_cap:
+        slot = _day_start(slot.date() + timedelta(days=1), start_t, tz)
+        daily_count = 0
+    while True:
+        yield slot
+        daily_count += 1
+        slot = tz.normalize(slot + timedelta(minutes=random.randint(settings.interval_min, settings.interval_max)))
+        if slot.time() > end_t or daily_count >= settings.daily_cap:
+            slot = _day_start(slot.date() + timedelta(days=1), start_t, tz)
+            daily_count = 0
+
+
+def eligible_leads(db: Session):
+    return db.query(Lead.id).filter(Lead.consent.is_(True), Lead.unsubscribed.isnot(True))
+
+
+def _lane_tail(db: Session, settings: Settings, lane, gap_minutes: Optional[float] = None) -> Tuple[datetime, int]:
+    # Where the account's existing mail1 queue ends, and how many sends are booked that day,
+    # so a new campaign continues the account's pacing instead of overlapping it.
+    # ``gap_minutes`` replaces the random interval after the last send (the forecast uses the mean).
     tz = pytz.timezone(settings.timezone)
-    start_hour, start_min = map(int, settings.start_time.split(":"))
-    end_hour, end_min = map(int, settings.end_time.split(":"))
-    start_t = time(start_hour, start_min)
-    end_t = time(end_hour, end_min)
     now = datetime.now(tz)
-    base = _next_window(now, start_t, end_t, tz)
+    last = (
+        db.query(func.max(ScheduledSend.scheduled_at))
+        .filter(ScheduledSend.step == "mail1", ScheduledSend.status == "queued", lane)
+        .scalar()
+    )
+    if last is None:
+        return now, 0
+    last_local = pytz.utc.localize(last).astimezone(tz)
+    if last_local <= now:
+        return now, 0
+    day_start = _to_utc(_day_start(last_local.date(), time(0, 0), tz))
+    booked = (
+        db.query(func.count(ScheduledSend.id))
+        .filter(
+            ScheduledSend.step == "mail1",
+            ScheduledSend.status == "queued",
+            ScheduledSend.scheduled_at >= day_start,
+            lane,
+        )
+        .scalar()
+    )
+    if gap_minutes is None:
+        gap_minutes = random.randint(settings.interval_min, settings.interval_max)
+    return last_local + timedelta(minutes=gap_minutes), booked
 
-    daily_count = 0
-    for lead in leads:
-        if not lead.consent or lead.unsubscribed:
-            continue
-        if daily_count >= settings.daily_cap:
+
+def _lead_ids(db: Session, segment: Optional[Segment]) -> Iterator[int]:
+    # Keyset pages over the targeted ids keep memory bounded.
+    last_id = 0
+    while True:
+        page = [
+            lead_id
+            for (lead_id,) in segment_leads(db, segment).filter(Lead.id > last_id).order_by(Lead.id).limit(SCHEDULE_CHUNK)
+        ]
+        if not page:
+            return
+        last_id = page[-1]
+        yield from page
+
+
+def _pending_window(db: Session, lane, now: datetime) -> List[Tuple[int, Optional[int], datetime]]:
+    # The lane's earliest FAIR_SHARE_WINDOW future, unclaimed mail1 items as
+    # (id, campaign_id, scheduled_at), read in keyset pages.
+    free = or_(ScheduledSend.lease_expires_at.is_(None), ScheduledSend.lease_expires_at < now)
+    window: List[Tuple[int, Optional[int], datetime]] = []
+    while len(window) < FAIR_SHARE_WINDOW:
+        page = db.query(ScheduledSend.id, ScheduledSend.campaign_id, ScheduledSend.scheduled_at).filter(
+            ScheduledSend.status == "queued",
+            ScheduledSend.scheduled_at > now,
+            ScheduledSend.step == "mail1",
+            free,
+            lane,
+        )
+        if window:
+            page = page.filter(_after((window[-1][2], window[-1][0])))
+        limit = min(SCHEDULE_CHUNK, FAIR_SHARE_WINDOW - len(window))
+        rows = page.order_by(ScheduledSend.scheduled_at, ScheduledSend.id).limit(limit).all()
+        window.extend(tuple(row) for row in rows)
+        if len(rows) < limit:
             break
-        scheduled_at = base
-        base += timedelta(minutes=random.randint(settings.interval_min, settings.interval_max))
-        if base.time() > end_t:
-            base = _next_window(base + timedelta(days=1), start_t, end_t, tz)
-            daily_count = 0
-        db.add(
-            ScheduledSend(
-                lead_id=lead.id,
-                campaign_id=campaign_id,
-                step="mail1",
-                scheduled_at=scheduled_at,
+    return window
+
+
+def schedule_campaign(db: Session, campaign_id: int, job: Optional[Job] = None):
+    campaign = db.get(Campaign, campaign_id)
+    default_id = default_account_id(db)
+    user_id = campaign.user_id or default_id
+    settings = ensure_settings(db, user_id)
+    lane = lane_filter(ScheduledSend.user_id, user_id, default_id)
+    base, booked = _lane_tail(db, settings, lane)
+    segment = db.get(Segment, campaign.segment_id) if campaign.segment_id else None
+    if job is not None:
+        job.total = segment_count(db, segment) if segment is not None else eligible_leads(db).count()
+        db.commit()
+
+    # The new campaign shares the lane's earliest pending mail1 slots with the
+    # campaigns holding them (share_slots); the rest of the queue is not
+    # touched, and whatever does not fit goes after it on new pacing slots.
+    now = datetime.utcnow()
+    window = _pending_window(db, lane, now)
+    times = [scheduled_at for _, _, scheduled_at in window]
+    tail = (_to_utc(slot) for slot in pacing_slots(settings, base, booked))
+    policy = {
+        key: (priority, weight)
+        for key, priority, weight in db.query(Campaign.id, Campaign.priority, Campaign.weight).filter(
+            Campaign.id.in_({key for _, key, _ in window if key is not None})
+        )
+    }
+    plan = share_slots(
+        [(key, item_id) for item_id, key, _ in window],
+        policy,
+        campaign_id,
+        campaign.priority,
+        campaign.weight,
+        _lead_ids(db, segment),
+    )
+    # A campaign created paused keeps its slots, held until it is resumed.
+    status = "paused" if campaign.paused else "queued"
+
+    rows: List[dict] = []
+    moves: List[dict] = []
+    first_slot = None
+    announced = False
+    for index, key, item in plan:
+        slot = times[index] if index is not None else next(tail)
+        if key == campaign_id:
+            rows.append(
+                {
+                    "lead_id": item,
+                    "campaign_id": campaign_id,
+                    "user_id": user_id,
+                    "step": "mail1",
+                    "status": status,
+                    "scheduled_at": slot,
+                }
+            )
+        else:
+            moves.append({"item_id": item, "slot": slot})
+        if first_slot is None:
+            # share_slots fills the window in order before anything goes after the queue.
+            first_slot = slot
+        if len(rows) >= SCHEDULE_CHUNK or len(moves) >= SCHEDULE_CHUNK:
+            _write_slots(db, campaign_id, rows, moves, now, job)
+            rows, moves = [], []
+            if not announced:
+                _announce(first_slot, user_id)
+                announced = True
+    _write_slots(db, campaign_id, rows, moves, now, job)
+    if first_slot is not None and not announced:
+        _announce(first_slot, user_id)
+
+
+def _write_slots(db: Session, campaign_id: int, rows: List[dict], moves: List[dict], now: datetime, job: Optional[Job]):
+    # Each chunk commits on its own, so progress is visible while the job runs.
+    if rows:
+        db.connection().execute(insert(ScheduledSend.__table__), rows)
+        record_queued(db, campaign_id, "mail1", len(rows))
+        if job is not None:
+            job.processed += len(rows)
+    if moves:
+        table = ScheduledSend.__table__
+        db.connection().execute(
+            update(table)
+            .where(
+                table.c.id == bindparam("item_id"),
+                or_(table.c.lease_expires_at.is_(None), table.c.lease_expires_at < now),
             )
+            .values(scheduled_at=bindparam("slot")),
+            moves,
         )
-        daily_count += 1
     db.commit()
 
 
-def enqueue_mail2(db: Session, log: SendLog, delay_days: int):
-    settings = ensure_settings(db)
-    tz = pytz.timezone(settings.timezone)
-    start_hour, start_min = map(int, settings.start_time.split(":"))
-    end_hour, end_min = map(int, settings.end_time.split(":"))
-    start_t = time(start_hour, start_min)
-    end_t = time(end_hour, end_min)
-
-    target = log.sent_at + timedelta(days=delay_days)
-    scheduled = _next_window(target, start_t, end_t, tz)
+def enqueue_mail2(db: Session, log: SendLog, delay_days: int, settings: Optional[Settings] = None):
+    settings = settings or ensure_settings(db, log.user_id)
+    tz, start_t, end_t = _window(settings)
+    target = pytz.utc.localize(log.sent_at) + timedelta(days=delay_days)
+    scheduled = _to_utc(_next_window(target, start_t, end_t, tz))
     db.add(
         ScheduledSend(
             lead_id=log.lead_id,
             campaign_id=log.campaign_id,
+            user_id=log.user_id,
             step="mail2",
             scheduled_at=scheduled,
         )
     )
-    db.commit()
+    record_queued(db, log.campaign_id, "mail2", 1)
+    # The caller commits. Enqueued from a send, so the dispatcher re-reads this
+    # lane when that run ends, which also covers a zero-day delay.
+    _announce(scheduled, log.user_id)
 
 
-def process_queue(db: Session):
-    user = current_user(db)
-    if not user:
-        return
-    creds = load_credentials(user)
-    client = GmailClient(creds)
-    now = datetime.utcnow()
-    queued = (
+def _after(after: Optional[Tuple[datetime, int]]):
+    # Keyset continuation so items left queued after an error are not claimed again this tick.
+    last_at, last_id = after
+    return or_(
+        ScheduledSend.scheduled_at > last_at,
+        and_(ScheduledSend.scheduled_at == last_at, ScheduledSend.id > last_id),
+    )
+
+
+def claim_due(
+    db: Session, owner: str, now: datetime, limit: int, after: Optional[Tuple[datetime, int]] = None, lane=None
+) -> List[ScheduledSend]:
+    expires = now + timedelta(seconds=LEASE_SECONDS)
+    free = or_(ScheduledSend.lease_expires_at.is_(None), ScheduledSend.lease_expires_at < now)
+    due = (
+        select(ScheduledSend.id)
+        .where(ScheduledSend.status == "queued", ScheduledSend.scheduled_at <= now, free)
+        .order_by(ScheduledSend.scheduled_at, ScheduledSend.id)
+        .limit(limit)
+    )
+    if after:
+        due = due.where(_after(after))
+    if lane is not None:
+        due = due.where(lane)
+    claim = update(ScheduledSend).values(lease_owner=owner, lease_expires_at=expires)
+    if db.get_bind().dialect.name == "postgresql":
+        ids = list(db.execute(due.with_for_update(skip_locked=True)).scalars())
+        if ids:
+            db.execute(claim.where(ScheduledSend.id.in_(ids)), execution_options={"synchronize_session": False})
+    else:
+        # A single UPDATE ... WHERE id IN (SELECT ...) is atomic under SQLite's database write lock.
+        db.execute(
+            claim.where(ScheduledSend.id.in_(due.scalar_subquery()), free),
+            execution_options={"synchronize_session": False},
+        )
+    db.commit()
+    return (
         db.query(ScheduledSend)
-        .filter(ScheduledSend.status == "queued", ScheduledSend.scheduled_at <= now)
-        .order_by(ScheduledSend.scheduled_at)
+        .filter(ScheduledSend.lease_owner == owner, ScheduledSend.lease_expires_at == expires)
+        .order_by(ScheduledSend.scheduled_at, ScheduledSend.id)
         .all()
     )
-    for item in queued:
-        lead = db.query(Lead).get(item.lead_id)
-        campaign = db.query(Campaign).get(item.campaign_id)
-        if not lead or lead.unsubscribed or not lead.consent or (campaign and campaign.paused):
-            item.status = "skipped_no_consent"
-            db.add(
-                SendLog(
-                    lead_id=item.lead_id,
-                    campaign_id=item.campaign_id,
-                    step=item.step,
-                    status="skipped_no_consent",
-                    scheduled_at=item.scheduled_at,
-                )
-            )
-            db.delete(item)
-            db.commit()
-            continue
 
-        if item.step == "mail2":
-            previous = (
-                db.query(SendLog)
-                .filter(
-                    SendLog.lead_id == lead.id,
-                    SendLog.campaign_id == campaign.id,
-                    SendLog.step == "mail1",
-                    SendLog.status == "sent",
-                )
-                .order_by(SendLog.sent_at.desc())
-                .first()
-            )
-            if previous and previous.thread_id:
-                if client.thread_has_reply(previous.thread_id, lead.email, previous.sent_at):
-                    item.status = "skipped_replied"
-                    db.add(
-                        SendLog(
-                            lead_id=item.lead_id,
-                            campaign_id=item.campaign_id,
-                            step="mail2",
-                            status="skipped_replied",
-                            scheduled_at=item.scheduled_at,
-                        )
-                    )
-                    db.delete(item)
-                    db.commit()
-                    continue
 
-        unsubscribe_url = f"{os.environ.get('APP_BASE_URL', 'http://localhost:8000')}/unsubscribe/{lead.unsubscribe_token}"
-        subject = campaign.mail1_subject if item.step == "mail1" else campaign.mail2_subject
+def renew_leases(db: Session, owner: str, items: List[ScheduledSend]) -> Set[int]:
+    expires = datetime.utcnow() + timedelta(seconds=LEASE_SECONDS)
+    ids = [item.id for item in items]
+    db.execute(
+        update(ScheduledSend)
+        .where(ScheduledSend.id.in_(ids), ScheduledSend.lease_owner == owner)
+        .values(lease_expires_at=expires),
+        execution_options={"synchronize_session": False},
+    )
+    db.commit()
+    held = db.query(ScheduledSend.id).filter(
+        ScheduledSend.id.in_(ids), ScheduledSend.lease_owner == owner, ScheduledSend.lease_expires_at == expires
+    )
+    return {item_id for (item_id,) in held}
+
+
+def release_leases(db: Session, owner: str):
+    db.query(ScheduledSend).filter(ScheduledSend.lease_owner == owner).update(
+        {"lease_owner": None, "lease_expires_at": None}, synchronize_session=False
+    )
+    db.commit()
+
+
+def _sent_today(db: Session, settings: Settings, lane) -> int:
+    tz = pytz.timezone(settings.timezone)
+    midnight = _to_utc(_day_start(datetime.now(tz).date(), time(0, 0), tz))
+    return (
+        db.query(func.count(SendLog.id))
+        .filter(SendLog.status == "sent", SendLog.sent_at >= midnight, lane)
+        .scalar()
+    )
+
+
+def _previous_mail1(db: Session, items: List[ScheduledSend]) -> Dict[Tuple[int, int], SendLog]:
+    pairs = {(i.lead_id, i.campaign_id) for i in items if i.step == "mail2"}
+    if not pairs:
+        return {}
+    logs = (
+        db.query(SendLog)
+        .filter(
+            SendLog.lead_id.in_({lead_id for lead_id, _ in pairs}),
+            SendLog.campaign_id.in_({campaign_id for _, campaign_id in pairs}),
+            SendLog.step == "mail1",
+            SendLog.status == "sent",
+        )
+        .order_by(SendLog.sent_at)
+    )
+    # Ordered by sent_at so the latest mail1 per pair wins.
+    return {(log.lead_id, log.campaign_id): log for log in logs if (log.lead_id, log.campaign_id) in pairs}
+
+
+def _replied_pairs(db: Session, items: List[ScheduledSend]) -> Set[Tuple[int, int]]:
+    mail2 = [i for i in items if i.step == "mail2"]
+    if not mail2:
+        return set()
+    rows = db.query(Reply.lead_id, Reply.campaign_id).filter(
+        Reply.lead_id.in_({i.lead_id for i in mail2}),
+        Reply.campaign_id.in_({i.campaign_id for i in mail2}),
+    )
+    return {(lead_id, campaign_id) for lead_id, campaign_id in rows}
+
+
+def _skip(db: Session, item: ScheduledSend, status: str, user_id: int) -> SendLog:
+    log = SendLog(
+        lead_id=item.lead_id,
+        campaign_id=item.campaign_id,
+        user_id=user_id,
+        step=item.step,
+        status=status,
+        scheduled_at=item.scheduled_at,
+    )
+    db.add(log)
+    db.delete(item)
+    return log
+
+
+def retry_delay(attempts: int, retry_after: Optional[float] = None) -> float:
+    backoff = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    return max(random.uniform(backoff / 2, backoff), retry_after or 0)
+
+
+def _fail(db: Session, item: ScheduledSend, exc: Exception, user_id: int) -> SendLog:
+    # A retryable failure stays queued but is pushed out of the due window; anything
+    # else (or the last attempt) parks the item as "failed" for the dead-letter view.
+    item.attempts = (item.attempts or 0) + 1
+    item.last_error = str(exc)
+    # Released now: claim_due returns everything this owner still holds.
+    item.lease_owner = None
+    item.lease_expires_at = None
+    log = SendLog(
+        lead_id=item.lead_id,
+        campaign_id=item.campaign_id,
+        user_id=user_id,
+        step=item.step,
+        status="error",
+        scheduled_at=item.scheduled_at,
+        error=str(exc),
+    )
+    if getattr(exc, "retryable", True) and item.attempts < MAX_SEND_ATTEMPTS:
+        delay = retry_delay(item.attempts, getattr(exc, "retry_after", None))
+        item.scheduled_at = datetime.utcnow() + timedelta(seconds=delay)
+        send_failures_total.inc(outcome="retry")
+    else:
+        item.status = "failed"
+        log.status = "failed"
+        send_failures_total.inc(outcome="failed")
+    db.add(log)
+    return log
+
+
+def requeue_failed(db: Session, item_ids: Optional[List[int]] = None, campaign_id: Optional[int] = None) -> int:
+    # Dead-lettered items go back to the queue, due now, with a fresh attempt budget.
+    filters = [ScheduledSend.status == "failed"]
+    if item_ids is not None:
+        filters.append(ScheduledSend.id.in_(item_ids))
+    if campaign_id is not None:
+        filters.append(ScheduledSend.campaign_id == campaign_id)
+    groups = (
+        db.query(ScheduledSend.campaign_id, ScheduledSend.step, func.count(ScheduledSend.id))
+        .filter(*filters)
+        .group_by(ScheduledSend.campaign_id, ScheduledSend.step)
+        .all()
+    )
+    requeued = (
+        db.query(ScheduledSend)
+        .filter(*filters)
+        .update(
+            {"status": "queued", "attempts": 0, "last_error": None, "scheduled_at": datetime.utcnow()},
+            synchronize_session=False,
+        )
+    )
+    for group_campaign_id, step, count in groups:
+        record_queued(db, group_campaign_id, step, count)
+    db.commit()
+    if requeued:
+        _announce(datetime.utcnow(), None)
+    return requeued
+
+
+def _window_seconds(settings: Settings, when: datetime) -> Tuple[int, int, int]:
+    # The send window as (UTC offset, start, length) in seconds, with the offset
+    # taken at ``when`` (naive UTC): a rebase spanning a DST change lands an hour
+    # off. Its closing instant counts as outside, being the next day's start in
+    # window time.
+    tz, start_t, end_t = _window(settings)
+    offset = int(pytz.utc.localize(when).astimezone(tz).utcoffset().total_seconds())
+    start = start_t.hour * 3600 + start_t.minute * 60
+    return offset, start, max(1, end_t.hour * 3600 + end_t.minute * 60 - start)
+
+
+def _window_position(value: datetime, offset: int, start: int, length: int) -> int:
+    # Seconds of send window elapsed before ``value`` (naive UTC), counting from
+    # the epoch; times outside the window count as its nearest edge.
+    local = int((value - datetime(1970, 1, 1)).total_seconds()) + offset
+    day, second = divmod(local, 86400)
+    return day * length + min(max(second - start, 0), length)
+
+
+def _window_time(position: int, offset: int, start: int, length: int) -> datetime:
+    # The inverse of _window_position, as naive UTC.
+    day, second = divmod(position, length)
+    return datetime(1970, 1, 1) + timedelta(seconds=day * 86400 + start + second - offset)
+
+
+def _epoch_seconds(db: Session, column):
+    if db.get_bind().dialect.name == "sqlite":
+        return cast(func.strftime("%s", column), Integer)
+    return cast(func.floor(func.extract("epoch", column)), BigInteger)
+
+
+def _rebase(db: Session, column, delta: int, offset: int, start: int, length: int):
+    # _window_time(_window_position(column) + delta) in SQL, for times inside the
+    # window: a send pushed past the window's end carries over to the next day's
+    # start with its gap intact. SQLite stores datetimes as text ("YYYY-MM-DD
+    # HH:MM:SS.ffffff"); the microseconds are kept from the original value.
+    seconds = _epoch_seconds(db, column)
+    local = seconds + offset
+    position = local // 86400 * length + local % 86400 - start + delta
+    moved = position // length * 86400 + start + position % length - offset
+    if db.get_bind().dialect.name == "sqlite":
+        return func.strftime("%Y-%m-%d %H:%M:%S", moved, "unixepoch").concat(func.substr(column, 20))
+    return column + (moved - seconds) * literal_column("interval '1 second'")
+
+
+def pause_sends(db: Session, campaign: Campaign) -> int:
+    # Holds the campaign's queued items in place; claim_due only takes "queued".
+    campaign.paused = True
+    held = (
+        db.query(ScheduledSend)
+        .filter(ScheduledSend.campaign_id == campaign.id, ScheduledSend.status == "queued")
+        .update({"status": "paused"}, synchronize_session=False)
+    )
+    db.commit()
+    return held
+
+
+def resume_sends(db: Session, campaign: Campaign) -> Tuple[int, Optional[datetime]]:
+    # Puts held items back, rebased so the earliest goes out at the account's
+    # next open window. Items inside the window keep their gaps in window time,
+    # in one update; the few outside it (retry backoffs) are re-slotted through
+    # pacing_slots from where that puts them. Returns the count and the new
+    # earliest send time.
+    user_id = campaign.user_id or default_account_id(db)
+    settings = ensure_settings(db, user_id)
+    campaign.paused = False
+    held = [ScheduledSend.campaign_id == campaign.id, ScheduledSend.status == "paused"]
+    earliest = db.query(func.min(ScheduledSend.scheduled_at)).filter(*held).scalar()
+    if earliest is None:
+        db.commit()
+        return 0, None
+    tz, start_t, end_t = _window(settings)
+    first = _to_utc(_next_window(datetime.utcnow().replace(tzinfo=pytz.utc), start_t, end_t, tz))
+    window = _window_seconds(settings, first)
+    # Not yet overdue: leave the items where they were.
+    delta = max(0, _window_position(first, *window) - _window_position(earliest, *window))
+    if not delta:
+        resumed = db.query(ScheduledSend).filter(*held).update({"status": "queued"}, synchronize_session=False)
+        db.commit()
+        _announce(earliest, user_id)
+        return resumed, earliest
+
+    offset, start, length = window
+    inside = ((_epoch_seconds(db, ScheduledSend.scheduled_at) + offset) % 86400).between(start, start + length - 1)
+    resumed = (
+        db.query(ScheduledSend)
+        .filter(*held, inside)
+        .update(
+            {"status": "queued", "scheduled_at": _rebase(db, ScheduledSend.scheduled_at, delta, *window)},
+            synchronize_session=False,
+        )
+    )
+    resumed += _reslot_held(db, settings, held, delta, window)
+    db.commit()
+    _announce(first, user_id)
+    return resumed, first
+
+
+def _reslot_held(db: Session, settings: Settings, held: list, delta: int, window: Tuple[int, int, int]) -> int:
+    # Requeues what is still held a page at a time: each item goes to the first
+    # pacing slot at or after its rebased time and after the previous item's.
+    table = ScheduledSend.__table__
+    requeue = update(table).where(table.c.id == bindparam("item_id")).values(status="queued", scheduled_at=bindparam("slot"))
+    slots = slot = None
+    resumed = 0
+    while True:
+        page = (
+            db.query(ScheduledSend.id, ScheduledSend.scheduled_at)
+            .filter(*held)
+            .order_by(ScheduledSend.scheduled_at, ScheduledSend.id)
+            .limit(SCHEDULE_CHUNK)
+            .all()
+        )
+        if not page:
+            return resumed
+        moves = []
+        for item_id, scheduled_at in page:
+            target = _window_time(_window_position(scheduled_at, *window) + delta, *window)
+            if slot is None or target > slot:
+                slots = (_to_utc(when) for when in pacing_slots(settings, pytz.utc.localize(target)))
+            slot = next(slots)
+            moves.append({"item_id": item_id, "slot": slot})
+        db.connection().execute(requeue, moves)
+        resumed += len(moves)
+
+
+def _dispatch_batch(
+    db: Session, client: GmailClient, user, settings: Settings, items, replies_synced: bool, owner: str
+) -> Tuple[int, bool]:
+    leads = {l.id: l for l in db.query(Lead).filter(Lead.id.in_({i.lead_id for i in items}))}
+    campaigns = {c.id: c for c in db.query(Campaign).filter(Campaign.id.in_({i.campaign_id for i in items}))}
+    if replies_synced:
+        replied = _replied_pairs(db, items)
+        previous = {}
+    else:
+        replied = set()
+        previous = _previous_mail1(db, items)
+
+    # Everything that can be decided without Gmail is settled in one transaction up front.
+    to_send = []
+    skipped = []
+    for item in items:
+        lead = leads.get(item.lead_id)
+        campaign = campaigns.get(item.campaign_id)
+        if not lead or not campaign or lead.unsubscribed or not lead.consent:
+            skipped.append(_skip(db, item, "skipped_no_consent", user.id))
+        elif campaign.paused:
+            # Claimed as the campaign was paused (or requeued while paused): hold it with the rest.
+            item.status = "paused"
+            item.lease_owner = item.lease_expires_at = None
+        elif item.step == "mail2" and (item.lead_id, item.campaign_id) in replied:
+            skipped.append(_skip(db, item, "skipped_replied", user.id))
+        else:
+            to_send.append((item, lead, campaign))
+    record_logs(db, skipped)
+    db.commit()
+
+    base_url = os.environ.get("APP_BASE_URL", "http://localhost:8000")
+    renew_at = datetime.utcnow() + timedelta(seconds=LEASE_SECONDS / 2)
+    sent_count = 0
+    for index, (item, lead, campaign) in enumerate(to_send):
+        if datetime.utcnow() >= renew_at:
+            held = renew_leases(db, owner, [pending for pending, _, _ in to_send[index:]])
+            renew_at = datetime.utcnow() + timedelta(seconds=LEASE_SECONDS / 2)
+            if item.id not in held:
+                # Lease lost (e.g. we stalled past expiry and another worker reclaimed it).
+                continue
+        unsubscribe_url = f"{base_url}/unsubscribe/{lead.unsubscribe_token}"
+        values = lead_values(lead, unsubscribe_url)
+        key = (campaign.id, item.step)
+        subject_template = campaign.mail1_subject if item.step == "mail1" else campaign.mail2_subject
         body_template = campaign.mail1_body if item.step == "mail1" else campaign.mail2_body
-        body = build_body(body_template, lead, unsubscribe_url)
+        subject = build_subject(subject_template, values, key)
+        body = build_body(body_template, lead, unsubscribe_url, key, values)
         try:
+            if item.step == "mail2" and not replies_synced:
+                # The per-thread reply check fails like a send: retried, or throttling the batch.
+                log = previous.get((lead.id, campaign.id))
+                if log and log.thread_id and client.thread_has_reply(log.thread_id, lead.email, log.sent_at):
+                    record_logs(db, [_skip(db, item, "skipped_replied", user.id)])
+                    db.commit()
+                    continue
             sent = client.send_message(user.email, lead.email, subject, body)
-            message_id = sent.get("id")
-            thread_id = sent.get("threadId")
-            log = SendLog(
-                lead_id=lead.id,
-                campaign_id=campaign.id,
-                step=item.step,
-                status="sent",
-                scheduled_at=item.scheduled_at,
-                sent_at=datetime.utcnow(),
-                message_id=message_id,
-                thread_id=thread_id,
-            )
-            db.add(log)
-            item.status = "sent"
-            db.delete(item)
-            db.commit()
-            if item.step == "mail1":
-                enqueue_mail2(db, log, campaign.delay_days)
         except Exception as exc:  # pragma: no cover - best effort
-            db.add(
-                SendLog(
-                    lead_id=lead.id,
-                    campaign_id=campaign.id,
-                    step=item.step,
-                    status="error",
-                    scheduled_at=item.scheduled_at,
-                    error=str(exc),
-                )
-            )
+            record_error("send", exc)
+            record_logs(db, [_fail(db, item, exc, user.id)])
             db.commit()
+            if getattr(exc, "rate_limited", False):
+                # The account is throttled; the rest of the batch would only fail the same way.
+                return sent_count, True
+            continue
+        log = SendLog(
+            lead_id=lead.id,
+            campaign_id=campaign.id,
+            user_id=user.id,
+            step=item.step,
+            status="sent",
+            scheduled_at=item.scheduled_at,
+            sent_at=datetime.utcnow(),
+            message_id=sent.get("id"),
+            thread_id=sent.get("threadId"),
+        )
+        db.add(log)
+        record_logs(db, [log])
+        if item.step == "mail1":
+            enqueue_mail2(db, log, campaign.delay_days, settings)
+        db.delete(item)
+        # One transaction per delivered message: log, follow-up and dequeue land together.
+        db.commit()
+        sent_count += 1
+    db.commit()
+    return sent_count, False
+
+
+def _batch_size(client, account: str, budget: int, replies_synced: bool) -> int:
+    # Claim only what the account's Gmail quota can send before the leases need
+    # renewing, counting a threads.get per item when replies are checked per thread.
+    size = min(DISPATCH_BATCH, budget)
+    governor = getattr(client, "quota", None)
+    headroom = governor.headroom(account, within=LEASE_SECONDS / 2) if governor else None
+    if headroom is None:
+        return size
+    per_item = unit_cost("messages.send") + (0 if replies_synced else unit_cost("threads.get"))
+    return max(1, min(size, int(headroom // per_item)))
+
+
+def process_queue(db: Session, user: Optional[User] = None, owner: Optional[str] = None, client=None) -> Tuple[int, bool]:
+    # Drains one account's lane; without ``user`` that is the default account.
+    # Returns the items handled and whether the run stopped with due items left
+    # behind on purpose (daily cap reached, Gmail throttling).
+    user = user or current_user(db)
+    if not user:
+        return 0, False
+    owner = owner or f"{WORKER_ID}:{threading.get_ident()}"
+    if client is None:
+        client = GmailClient(load_credentials(user), account=user.email)
+    settings = ensure_settings(db, user.id)
+    default_id = default_account_id(db)
+    lane = lane_filter(ScheduledSend.user_id, user.id, default_id)
+    now = datetime.utcnow()
+    budget = settings.daily_cap - _sent_today(db, settings, lane_filter(SendLog.user_id, user.id, default_id))
+    if budget <= 0:
+        return 0, True
+
+    replies_synced = False
+    mail2_due = (
+        db.query(ScheduledSend.id)
+        .filter(
+            ScheduledSend.status == "queued",
+            ScheduledSend.scheduled_at <= now,
+            ScheduledSend.step == "mail2",
+            lane,
+        )
+        .first()
+    )
+    if mail2_due:
+        try:
+            sync_replies(db, client, user.email, user.id)
+            replies_synced = True
+        except Exception as exc:  # pragma: no cover - fall back to per-thread checks this tick
+            record_error("sync_replies", exc)
+            db.rollback()
+
+    # Prefetched leads/campaigns must stay loaded across the per-send commits,
+    # otherwise every attribute access after a commit is another SELECT.
+    expire_on_commit = db.expire_on_commit
+    db.expire_on_commit = False
+    handled = 0
+    throttled = False
+    try:
+        after = None
+        while budget > 0:
+            items = claim_due(db, owner, now, _batch_size(client, user.email, budget, replies_synced), after, lane)
+            if not items:
+                break
+            after = (items[-1].scheduled_at, items[-1].id)
+            handled += len(items)
+            sent, throttled = _dispatch_batch(db, client, user, settings, items, replies_synced, owner)
+            budget -= sent
+            if throttled:
+                break
+    finally:
+        db.expire_on_commit = expire_on_commit
+        db.rollback()
+        # Anything still leased (send errors) becomes claimable again right away.
+        release_leases(db, owner)
+    return handled, throttled or budget <= 0
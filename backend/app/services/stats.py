@@ -0,0 +1,145 @@
+from collections import Counter
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, func, insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from ..metrics import sends_total
+from ..models import CampaignDailyStat, CampaignStat, Job, ScheduledSend, SendLog
+
+# Counters are bumped in the caller's transaction, so they commit or roll back
+# together with the send_logs / scheduled_sends rows they describe.
+
+STATUSES = ("queued", "sent", "skipped_no_consent", "skipped_replied", "error", "failed")
+
+
+@lru_cache(maxsize=None)
+def _upsert(dialect: str, model, keys: Tuple[str, ...], column: str):
+    # Built once per dialect and counter table so SQLAlchemy's compiled cache is reused.
+    table = model.__table__
+    module = sqlite if dialect == "sqlite" else postgresql
+    stmt = module.insert(table).values({name: bindparam(name) for name in keys + (column,)})
+    return stmt.on_conflict_do_update(index_elements=list(keys), set_={column: table.c[column] + stmt.excluded[column]})
+
+
+def _bump(db: Session, model, column: str, rows: List[dict]):
+    # ``rows`` hold the key columns plus the delta under ``column``.
+    if not rows:
+        return
+    keys = tuple(k for k in rows[0] if k != column)
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        db.execute(_upsert(dialect, model, keys, column), rows)
+        return
+    table = model.__table__
+    for row in rows:
+        updated = db.execute(
+            update(table)
+            .where(*[table.c[k] == row[k] for k in keys])
+            .values({column: table.c[column] + row[column]})
+        )
+        if not updated.rowcount:
+            db.execute(insert(table).values(**row))
+
+
+def record_queued(db: Session, campaign_id: int, step: str, delta: int):
+    if delta:
+        _bump(db, CampaignStat, "count", [{"campaign_id": campaign_id, "step": step, "status": "queued", "count": delta}])
+
+
+def record_logs(db: Session, logs: Iterable[SendLog]):
+    # Every log except "error" means its scheduled_sends row left the queue
+    # (removed, or parked as "failed").
+    counts: Counter = Counter()
+    daily: Counter = Counter()
+    for log in logs:
+        sends_total.inc(step=log.step, status=log.status)
+        counts[(log.campaign_id, log.step, log.status)] += 1
+        if log.status != "error":
+            counts[(log.campaign_id, log.step, "queued")] -= 1
+        if log.status == "sent" and log.sent_at:
+            daily[(log.campaign_id, log.sent_at.date())] += 1
+    _bump(
+        db,
+        CampaignStat,
+        "count",
+        [
+            {"campaign_id": campaign_id, "step": step, "status": status, "count": delta}
+            for (campaign_id, step, status), delta in counts.items()
+            if delta
+        ],
+    )
+    _bump(
+        db,
+        CampaignDailyStat,
+        "sent",
+        [{"campaign_id": campaign_id, "day": day, "sent": delta} for (campaign_id, day), delta in daily.items()],
+    )
+
+
+def campaign_stats(db: Session, campaign_id: int, days: int = 30) -> dict:
+    steps = {step: dict.fromkeys(STATUSES, 0) for step in ("mail1", "mail2")}
+    rows = db.query(CampaignStat.step, CampaignStat.status, CampaignStat.count).filter(
+        CampaignStat.campaign_id == campaign_id
+    )
+    for step, status, count in rows:
+        steps.setdefault(step, dict.fromkeys(STATUSES, 0))[status] = count
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    daily = (
+        db.query(CampaignDailyStat.day, CampaignDailyStat.sent)
+        .filter(CampaignDailyStat.campaign_id == campaign_id, CampaignDailyStat.day >= since)
+        .order_by(CampaignDailyStat.day)
+    )
+    return {
+        "campaign_id": campaign_id,
+        "steps": steps,
+        "daily": [{"day": day.isoformat(), "sent": sent} for day, sent in daily],
+    }
+
+
+def rebuild_stats(db: Session, job: Optional[Job] = None, campaign_id: Optional[int] = None):
+    # Recounts from send_logs and scheduled_sends in one transaction, replacing
+    # whatever the counters say. Used to backfill and to repair drift.
+    stat_filter = [CampaignStat.campaign_id == campaign_id] if campaign_id else []
+    daily_filter = [CampaignDailyStat.campaign_id == campaign_id] if campaign_id else []
+    log_filter = [SendLog.campaign_id == campaign_id] if campaign_id else []
+    queue_filter = [ScheduledSend.campaign_id == campaign_id] if campaign_id else []
+
+    db.query(CampaignStat).filter(*stat_filter).delete(synchronize_session=False)
+    db.query(CampaignDailyStat).filter(*daily_filter).delete(synchronize_session=False)
+    stats = [
+        {"campaign_id": cid, "step": step, "status": status, "count": count}
+        for cid, step, status, count in db.query(
+            SendLog.campaign_id, SendLog.step, SendLog.status, func.count(SendLog.id)
+        )
+        .filter(SendLog.campaign_id.isnot(None), *log_filter)
+        .group_by(SendLog.campaign_id, SendLog.step, SendLog.status)
+    ]
+    stats += [
+        {"campaign_id": cid, "step": step, "status": "queued", "count": count}
+        for cid, step, count in db.query(ScheduledSend.campaign_id, ScheduledSend.step, func.count(ScheduledSend.id))
+        .filter(ScheduledSend.campaign_id.isnot(None), ScheduledSend.status != "failed", *queue_filter)
+        .group_by(ScheduledSend.campaign_id, ScheduledSend.step)
+    ]
+    day = func.date(SendLog.sent_at)
+    daily = [
+        {"campaign_id": cid, "day": _as_date(sent_day), "sent": count}
+        for cid, sent_day, count in db.query(SendLog.campaign_id, day, func.count(SendLog.id))
+        .filter(SendLog.campaign_id.isnot(None), SendLog.status == "sent", SendLog.sent_at.isnot(None), *log_filter)
+        .group_by(SendLog.campaign_id, day)
+    ]
+    if stats:
+        db.execute(insert(CampaignStat.__table__), stats)
+    if daily:
+        db.execute(insert(CampaignDailyStat.__table__), daily)
+    if job is not None:
+        job.processed = len(stats) + len(daily)
+    db.commit()
+
+
+def _as_date(value) -> date:
+    # SQLite's date() returns text.
+    return date.fromisoformat(value[:10]) if isinstance(value, str) else value
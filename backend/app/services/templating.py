@@ -0,0 +1,92 @@
+import html
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, List, Mapping, Tuple
+
+# {{name}} is escaped for HTML bodies, {{{name}}} is inserted as-is, and
+# {{name|fallback}} renders the fallback when the lead has no value.
+_TOKEN = re.compile(r"\{\{\{\s*([\w.-]+)\s*(?:\|([^}]*))?\}\}\}|\{\{\s*([\w.-]+)\s*(?:\|([^}]*))?\}\}")
+
+
+class Template:
+    __slots__ = ("parts", "slots")
+
+    def __init__(self, parts: List[str], slots: List[Tuple[int, str, str, bool]]):
+        self.parts = parts
+        self.slots = slots
+
+    def render(self, values: Mapping[str, Any]) -> str:
+        if not self.slots:
+            return self.parts[0] if self.parts else ""
+        parts = self.parts[:]
+        for index, name, default, escape in self.slots:
+            value = values.get(name)
+            if value is None or value == "":
+                parts[index] = default
+            else:
+                value = str(value)
+                parts[index] = html.escape(value) if escape else value
+        return "".join(parts)
+
+
+def compile_template(source: str, escape: bool = True) -> Template:
+    parts: List[str] = []
+    slots: List[Tuple[int, str, str, bool]] = []
+    position = 0
+    for match in _TOKEN.finditer(source or ""):
+        if match.start() > position:
+            parts.append(source[position : match.start()])
+        raw_name, raw_default, name, default = match.groups()
+        if raw_name:
+            slots.append((len(parts), raw_name, (raw_default or "").strip(), False))
+        else:
+            slot_default = (default or "").strip()
+            slots.append((len(parts), name, html.escape(slot_default) if escape else slot_default, escape))
+        parts.append("")
+        position = match.end()
+    if position < len(source or ""):
+        parts.append(source[position:])
+    return Template(parts, slots)
+
+
+class TemplateCache:
+    # Compiled templates keyed by e.g. (campaign_id, field). The source is kept
+    # alongside, so an edited campaign recompiles on its next render in every
+    # process (API and worker) without any explicit invalidation.
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, Tuple[str, bool, Template]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, source: str, escape: bool = True, suffix: str = "") -> Template:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == escape and (entry[0] is source or entry[0] == source):
+                self._entries.move_to_end(key)
+                return entry[2]
+        template = compile_template(source + suffix, escape)
+        with self._lock:
+            self._entries[key] = (source, escape, template)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return template
+
+
+template_cache = TemplateCache()
+
+
+def lead_values(lead, unsubscribe_url: str) -> dict:
+    values = dict(lead.custom_fields or {})
+    values.update(
+        first_name=lead.first_name or "",
+        email=lead.email,
+        unsubscribe_url=unsubscribe_url,
+    )
+    # Promoted columns; left out when empty so {{company|default}} still applies.
+    if lead.company:
+        values["company"] = lead.company
+    if lead.country:
+        values["country"] = lead.country
+    return values
@@ -0,0 +1,137 @@
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import time
+from typing import BinaryIO, Iterable, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+
+from ..db import SessionLocal
+from ..models import TemplateAttachment
+
+logger = logging.getLogger("mailer.uploads")
+
+UPLOAD_ROOT = os.environ.get("UPLOAD_ROOT", "uploads")
+IMAGE_DIR = os.path.join(UPLOAD_ROOT, "images")
+ATTACH_DIR = os.path.join(UPLOAD_ROOT, "attachments")
+ATTACH_URL = "/uploads/attachments/"
+IMAGE_LIMIT = 5 * 1024 * 1024
+ATTACHMENT_LIMIT = 25 * 1024 * 1024
+COPY_CHUNK = 1024 * 1024
+# An uploaded file is not referenced until its template is saved, so unreferenced
+# files younger than this are left alone (a re-upload of existing content refreshes it).
+ORPHAN_GRACE_SECONDS = int(os.environ.get("UPLOAD_ORPHAN_GRACE_SECONDS", "3600"))
+
+_EXTENSION = re.compile(r"^\.[A-Za-z0-9]{1,10}$")
+
+os.makedirs(IMAGE_DIR, exist_ok=True)
+os.makedirs(ATTACH_DIR, exist_ok=True)
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+def _extension(filename: str) -> str:
+    ext = os.path.splitext(filename or "")[1]
+    return ext.lower() if _EXTENSION.match(ext) else ""
+
+
+def store_upload(src: BinaryIO, directory: str, filename: str, limit: int) -> Tuple[str, int]:
+    # Copies in chunks while hashing and stores the file under its SHA-256, so the
+    # same content uploaded twice is kept once. Blocking: call from a threadpool.
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".upload-")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = src.read(COPY_CHUNK)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > limit:
+                    raise UploadTooLarge(size)
+                digest.update(chunk)
+                out.write(chunk)
+        name = f"{digest.hexdigest()}{_extension(filename)}"
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            os.utime(path)
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return name, size
+
+
+def _attachment_path(url: str):
+    if not url or not url.startswith(ATTACH_URL):
+        return None
+    name = url[len(ATTACH_URL) :]
+    return os.path.join(ATTACH_DIR, name) if name and os.path.basename(name) == name else None
+
+
+def remove_unreferenced(urls: Iterable[str], grace: int = ORPHAN_GRACE_SECONDS) -> int:
+    # Reference counting over template_attachments: a file goes once no row points at it.
+    urls = {url for url in urls if _attachment_path(url)}
+    if not urls:
+        return 0
+    db = SessionLocal()
+    try:
+        referenced: Set[str] = {
+            url for (url,) in db.query(TemplateAttachment.url).filter(TemplateAttachment.url.in_(urls)).distinct()
+        }
+    finally:
+        db.close()
+    cutoff = time.time() - grace
+    removed = 0
+    for url in urls - referenced:
+        path = _attachment_path(url)
+        try:
+            if os.path.getmtime(path) <= cutoff:
+                os.remove(path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def sweep_orphans(grace: int = ORPHAN_GRACE_SECONDS) -> int:
+    # Catches uploads that were never saved into a template and files still in
+    # their grace period when their last row went away.
+    with os.scandir(ATTACH_DIR) as entries:
+        urls = [ATTACH_URL + entry.name for entry in entries if entry.is_file() and not entry.name.startswith(".")]
+    removed = remove_unreferenced(urls, grace)
+    if removed:
+        logger.info("removed %s orphaned attachment files", removed)
+    return removed
+
+
+@event.listens_for(TemplateAttachment, "after_delete")
+def _collect_released(mapper, connection, target):
+    # Also fires for rows removed as delete-orphans (template.attachments.clear()).
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("released_uploads", set()).add(target.url)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _release_on_commit(session):
+    urls = session.info.pop("released_uploads", None)
+    if urls:
+        try:
+            remove_unreferenced(urls)
+        except Exception:  # pragma: no cover - the periodic sweep will retry
+            logger.exception("attachment cleanup failed")
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_released(session):
+    session.info.pop("released_uploads", None)
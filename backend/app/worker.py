@@ -0,0 +1,43 @@
+import logging
+import os
+import signal
+import threading
+
+from .auth_google import credential_manager
+from .metrics import serve
+from .services.dispatch import Dispatcher
+from .services.sender import WORKER_ID
+
+logger = logging.getLogger("mailer.worker")
+
+# How often the dispatcher re-reads the queue for items queued by other processes
+# (the API); between resyncs it sleeps until the next due send.
+POLL_SECONDS = int(os.environ.get("WORKER_POLL_SECONDS", "60"))
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+
+_stop = threading.Event()
+
+
+def run(owner: str = WORKER_ID, poll_seconds: int = POLL_SECONDS):
+    logger.info("worker %s started", owner)
+    credential_manager.start()
+    dispatcher = Dispatcher(owner, resync_seconds=poll_seconds)
+    dispatcher.start()
+    _stop.wait()
+    # In-flight lanes finish their current sends before the process exits.
+    dispatcher.stop()
+    credential_manager.stop()
+    logger.info("worker %s stopped", owner)
+
+
+def stop(*_):
+    _stop.set()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if METRICS_PORT:
+        serve(METRICS_PORT)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    run()
@@ -0,0 +1,92 @@
+"""Peak memory and time per send for a message with a large attachment.
+
+Compares the old path (read the file, base64 it into the MIME tree, then
+base64 the whole message into an inline ``raw`` field) with the cached,
+spooled send that goes through the resumable media upload endpoint. The
+HTTP transport is a stub, so only client-side cost is measured.
+
+    cd backend && python -m benchmarks.bench_attachments
+"""
+import base64
+import os
+import tempfile
+import time
+import tracemalloc
+from email import encoders
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+import httplib2
+from google.oauth2.credentials import Credentials
+
+from app.gmail_client import GmailClient, ServicePool, attachment_cache
+from app.services.quota import QuotaGovernor
+
+SENDS = 5
+ATTACHMENT_MB = 20
+
+
+class StubHttp:
+    # Answers the resumable upload handshake and every chunk with a final response.
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        if hasattr(body, "read"):
+            body.read()
+        return (
+            httplib2.Response({"status": "200", "location": "https://upload.invalid/session"}),
+            b'{"id": "m1", "threadId": "t1"}',
+        )
+
+
+def old_raw(path: str) -> str:
+    message = MIMEMultipart("mixed")
+    message["To"] = "b@example.com"
+    message["From"] = "a@example.com"
+    message["Subject"] = "Report"
+    message.attach(MIMEText("<p>Attached</p>", "html"))
+    part = MIMEBase("application", "octet-stream")
+    with open(path, "rb") as f:
+        part.set_payload(f.read())
+    encoders.encode_base64(part)
+    part.add_header("Content-Disposition", "attachment; filename=report.bin")
+    message.attach(part)
+    return base64.urlsafe_b64encode(message.as_bytes()).decode()
+
+
+def _measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(SENDS):
+        fn()
+    elapsed = (time.perf_counter() - start) * 1000 / SENDS
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024
+
+
+def main():
+    with tempfile.NamedTemporaryFile(suffix=".bin", delete=False) as f:
+        f.write(os.urandom(ATTACHMENT_MB * 1024 * 1024))
+        path = f.name
+    try:
+        client = GmailClient(
+            Credentials(token="bench"),
+            account="bench",
+            pool=ServicePool(http_factory=lambda creds: StubHttp()),
+            quota=QuotaGovernor(rate=0),
+        )
+        attachments = [{"path": path, "filename": "report.bin"}]
+        attachment_cache.clear()
+        old_ms, old_peak = _measure(lambda: old_raw(path))
+        new_ms, new_peak = _measure(
+            lambda: client.send_message("a@example.com", "b@example.com", "Report", "<p>Attached</p>", attachments=attachments)
+        )
+        print(f"{ATTACHMENT_MB} MB attachment, {SENDS} sends")
+        print(f"inline raw       : {old_ms:8.1f} ms/send  peak {old_peak:7.1f} MB")
+        print(f"cached + upload  : {new_ms:8.1f} ms/send  peak {new_peak:7.1f} MB")
+    finally:
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
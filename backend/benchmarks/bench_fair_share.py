@@ -0,0 +1,87 @@
+"""Completion latency of small campaigns queued behind a large one.
+
+Simulates one account's pacing slots (SLOTS_PER_DAY a day) with a large
+campaign created first and small campaigns arriving while it drains. The
+old policy appends every campaign after the account's queue; fair share
+hands each new campaign a share of the earliest WINDOW pending slots with
+share_slots, as schedule_campaign does, and counts the pending items it
+moves. Both use the same slots, so throughput is equal and only who gets
+which slot changes.
+
+    cd backend && python -m benchmarks.bench_fair_share
+"""
+from collections import deque
+from statistics import median
+
+from app.services.fair_share import share_slots
+
+SLOTS_PER_DAY = 100
+LARGE = 20_000
+SMALL = 200
+SMALL_EVERY = 1_000  # slots between small campaign arrivals
+SMALL_COUNT = 15
+WINDOW = 10_000  # sender.FAIR_SHARE_WINDOW's default
+
+
+def arrivals():
+    # (slot, campaign, size, weight): campaign 0 is the large one.
+    yield 0, 0, LARGE, 1
+    for n in range(1, SMALL_COUNT + 1):
+        yield n * SMALL_EVERY, n, SMALL, 1
+
+
+def simulate(fair: bool):
+    # ``queue`` holds the campaign owning each pending slot, in slot order.
+    queue = deque()
+    created = {}
+    finished = {}
+    left = {}
+    moved = 0
+    incoming = deque(arrivals())
+    slot = 0
+    while incoming or queue:
+        while incoming and incoming[0][0] <= slot:
+            _, campaign, size, weight = incoming.popleft()
+            created[campaign] = slot
+            left[campaign] = size
+            if not fair:
+                queue.extend([campaign] * size)
+                continue
+            window = [queue.popleft() for _ in range(min(WINDOW, len(queue)))]
+            after = []
+            for index, key, _ in share_slots([(key, None) for key in window], {}, campaign, 0, weight, range(1, size + 1)):
+                moved += key != campaign
+                if index is None:
+                    after.append(key)
+                else:
+                    window[index] = key
+            queue.extendleft(reversed(window))
+            queue.extend(after)
+        if not queue:
+            slot = incoming[0][0]
+            continue
+        campaign = queue.popleft()
+        left[campaign] -= 1
+        if not left[campaign]:
+            finished[campaign] = slot
+        slot += 1
+    return created, finished, slot, moved
+
+
+def report(name: str, created, finished, slots: int, moved: int):
+    small = sorted((finished[c] - created[c] + 1) / SLOTS_PER_DAY for c in created if c)
+    p95 = small[min(len(small) - 1, int(len(small) * 0.95))]
+    print(
+        f"{name:12s} small p50 {median(small):6.1f} d  p95 {p95:6.1f} d  max {small[-1]:6.1f} d  "
+        f"large done {(finished[0] + 1) / SLOTS_PER_DAY:6.1f} d  all sent after {slots / SLOTS_PER_DAY:6.1f} d  "
+        f"moved {moved}"
+    )
+
+
+def main():
+    report("append", *simulate(fair=False))
+    report("fair share", *simulate(fair=True))
+
+
+if __name__ == "__main__":
+    main()
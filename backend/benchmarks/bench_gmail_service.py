@@ -0,0 +1,53 @@
+"""Per-call overhead of building the Gmail resource vs. reusing a pooled one.
+
+Runs offline: the HTTP transport is a stub that answers every request with a
+canned ``messages.send`` response, so only client-side cost is measured.
+
+    cd backend && python -m benchmarks.bench_gmail_service
+"""
+import time
+
+import httplib2
+from google.oauth2.credentials import Credentials
+
+from app.gmail_client import GmailClient, ServicePool
+from app.services.quota import QuotaGovernor
+
+CALLS = 200
+
+
+class StubHttp:
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        return httplib2.Response({"status": "200"}), b'{"id": "m1", "threadId": "t1"}'
+
+
+def _per_call_ms(fn, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) * 1000 / calls
+
+
+def main():
+    credentials = Credentials(token="bench")
+    unpaced = QuotaGovernor(rate=0)
+    # max_idle=0 never keeps a slot, which is the old build-per-call behaviour.
+    unpooled_client = GmailClient(
+        credentials, account="bench", pool=ServicePool(max_idle=0, http_factory=lambda creds: StubHttp()), quota=unpaced
+    )
+    pooled_client = GmailClient(
+        credentials, account="bench", pool=ServicePool(http_factory=lambda creds: StubHttp()), quota=unpaced
+    )
+
+    def send(client):
+        return client.send_message("a@example.com", "b@example.com", "Hi", "<p>Hi</p>")
+
+    unpooled = _per_call_ms(lambda: send(unpooled_client), CALLS)
+    pooled = _per_call_ms(lambda: send(pooled_client), CALLS)
+    print(f"build per call : {unpooled:8.3f} ms/call")
+    print(f"pooled service : {pooled:8.3f} ms/call")
+    print(f"speedup        : {unpooled / pooled:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Checks that the hot queries are planned against an index (SQLite).
+
+Builds a scratch database through the migrations, runs the real query paths
+while recording the SQL they emit, then runs EXPLAIN QUERY PLAN on each
+statement and checks for the expected index. Exits non-zero on a miss.
+
+    cd backend && python -m benchmarks.check_query_plans
+"""
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/plans.db"
+
+from sqlalchemy import event, text  # noqa: E402
+
+from app.db import SessionLocal, engine, migrate  # noqa: E402
+from app.models import Campaign, Lead, ScheduledSend, Segment, SendLog, User  # noqa: E402
+from app.routes.logs import _logs_query  # noqa: E402
+from app.routes.queue import QUEUE_ORDER, _queue_query  # noqa: E402
+from app.services.pagination import keyset_page  # noqa: E402
+from app.services.segments import segment_leads  # noqa: E402
+from app.services.sender import (  # noqa: E402
+    _previous_mail1,
+    _sent_today,
+    claim_due,
+    default_account_id,
+    ensure_settings,
+    lane_filter,
+    pause_sends,
+)
+
+
+@contextmanager
+def recorded():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE")):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def first(statements, table: str):
+    return next(s for s in statements if f"FROM {table}" in s[0])
+
+
+def plan(statement: str, parameters) -> str:
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    return " | ".join(row[-1] for row in rows)
+
+
+def seed(db):
+    user = User(email="plans@example.com", token_encrypted="x")
+    campaign = Campaign(name="c", mail1_subject="s", mail1_body="b", mail2_subject="s", mail2_body="b")
+    db.add_all([user, campaign])
+    db.flush()
+    now = datetime.utcnow()
+    for i in range(2000):
+        lead = Lead(email=f"lead{i}@example.com", consent=True, country="DE" if i % 20 == 0 else "US")
+        db.add(lead)
+        db.flush()
+        if i % 20 == 0:
+            db.add(ScheduledSend(lead_id=lead.id, campaign_id=campaign.id, step="mail2", scheduled_at=now - timedelta(minutes=i)))
+        db.add(SendLog(lead_id=lead.id, campaign_id=campaign.id, step="mail1", status="sent", sent_at=now))
+    db.commit()
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+    return user, campaign
+
+
+def main() -> int:
+    migrate()
+    db = SessionLocal()
+    user, campaign = seed(db)
+    lane = lane_filter(ScheduledSend.user_id, user.id, default_account_id(db))
+
+    checks = []
+    with recorded() as statements:
+        items = claim_due(db, "plans", datetime.utcnow(), 50, lane=lane)
+    checks.append(("claim_due", first(statements, "scheduled_sends"), "ix_scheduled_sends_status_scheduled_at"))
+    with recorded() as statements:
+        _previous_mail1(db, items)
+    checks.append(("previous mail1 lookup", first(statements, "send_logs"), "ix_send_logs_lead_campaign_step_status_sent_at"))
+    with recorded() as statements:
+        _sent_today(db, ensure_settings(db, user.id), lane_filter(SendLog.user_id, user.id, default_account_id(db)))
+    checks.append(("sent today (daily cap)", first(statements, "send_logs"), "ix_send_logs_status_sent_at"))
+    with recorded() as statements:
+        keyset_page(_logs_query(db, campaign.id), [SendLog.id], None, 50, descending=True)
+    checks.append(("logs page by campaign", first(statements, "send_logs"), "ix_send_logs_campaign_id_id"))
+    with recorded() as statements:
+        keyset_page(_queue_query(db, None), QUEUE_ORDER, None, 50)
+    checks.append(("queue page", first(statements, "scheduled_sends"), "ix_scheduled_sends_scheduled_at_id"))
+    with recorded() as statements:
+        segment = Segment(rules={"field": "country", "op": "eq", "value": "DE"})
+        segment_leads(db, segment).filter(Lead.id > 0).order_by(Lead.id).limit(1000).all()
+    checks.append(("segment schedule chunk", first(statements, "leads"), "ix_leads_country"))
+    with recorded() as statements:
+        pause_sends(db, campaign)
+    held = next(s for s in statements if s[0].startswith("UPDATE scheduled_sends"))
+    checks.append(("pause campaign", held, "ix_scheduled_sends_campaign_id_status"))
+    db.close()
+
+    failed = 0
+    for name, (statement, parameters), index in checks:
+        detail = plan(statement, parameters)
+        ok = index in detail
+        failed += not ok
+        print(f"{'ok  ' if ok else 'MISS'} {name:24s} {detail}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""Checks reply detection against FakeGmail.
+
+Builds a scratch database through the migrations, sends mail1 to three leads
+through ``FakeGmail`` with mail2 queued for each, then drives ``sync_replies``
+through its three paths: the first sync's thread scan, an incremental
+history.list sync (a lead's reply is marked, a colleague answering on another
+lead's thread is not), and the thread-scan fallback after the history cursor
+expires. Exits non-zero on a failed check.
+
+    cd backend && python -m benchmarks.check_reply_sync
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/replies.db"
+
+from app.db import SessionLocal, migrate  # noqa: E402
+from app.models import Campaign, Lead, MailboxSync, Reply, ScheduledSend, SendLog, User  # noqa: E402
+from app.services.replies import sync_replies  # noqa: E402
+from benchmarks.fake_gmail import FakeGmail  # noqa: E402
+
+ACCOUNT = "sender@example.com"
+
+
+def seed(db, gmail: FakeGmail):
+    user = User(email=ACCOUNT, token_encrypted="x")
+    campaign = Campaign(name="c", mail1_subject="s", mail1_body="b", mail2_subject="s", mail2_body="b")
+    db.add_all([user, campaign])
+    db.flush()
+    sent_at = datetime.utcnow() - timedelta(minutes=5)
+    threads = {}
+    for name in ("alice", "bob", "carol"):
+        lead = Lead(email=f"{name}@leads.example", consent=True)
+        db.add(lead)
+        db.flush()
+        sent = gmail.send_message(ACCOUNT, lead.email, "s", "b")
+        db.add(
+            SendLog(
+                lead_id=lead.id,
+                campaign_id=campaign.id,
+                user_id=user.id,
+                step="mail1",
+                status="sent",
+                sent_at=sent_at,
+                thread_id=sent["threadId"],
+            )
+        )
+        db.add(ScheduledSend(lead_id=lead.id, campaign_id=campaign.id, user_id=user.id, step="mail2", scheduled_at=sent_at + timedelta(days=3)))
+        threads[name] = (lead, sent["threadId"])
+    db.commit()
+    return user, campaign, threads
+
+
+def replied(db) -> set:
+    return {email for (email,) in db.query(Lead.email).join(Reply, Reply.lead_id == Lead.id)}
+
+
+def main() -> int:
+    migrate()
+    db = SessionLocal()
+    gmail = FakeGmail(ACCOUNT)
+    user, campaign, threads = seed(db, gmail)
+    checks = []
+
+    # No checkpoint yet: take one and scan the threads still awaiting mail2.
+    gmail.calls.clear()
+    marked = sync_replies(db, gmail, ACCOUNT, user.id)
+    checkpoint = db.query(MailboxSync.history_id).filter(MailboxSync.account == ACCOUNT).scalar()
+    checks.append(("first sync scans threads", marked == 0 and gmail.calls["threads.get"] == 3 and checkpoint is not None, dict(gmail.calls)))
+
+    # Incremental: one lead replies, a colleague answers on another lead's thread,
+    # and mail arrives on a thread the mailer never sent.
+    gmail.reply(threads["alice"][1], "Alice <alice@leads.example>")
+    gmail.reply(threads["bob"][1], "Colleague <someone@leads.example>")
+    gmail.reply("t-unrelated", "newsletter@example.org")
+    gmail.calls.clear()
+    marked = sync_replies(db, gmail, ACCOUNT, user.id)
+    checks.append(
+        (
+            "history.list marks the lead",
+            marked == 1 and replied(db) == {"alice@leads.example"},
+            sorted(replied(db)),
+        )
+    )
+    checks.append(
+        (
+            "history.list request volume",
+            gmail.calls["history.list"] == 1 and gmail.calls["messages.get"] == 2 and gmail.calls["threads.get"] == 0,
+            dict(gmail.calls),
+        )
+    )
+    gmail.calls.clear()
+    marked = sync_replies(db, gmail, ACCOUNT, user.id)
+    checks.append(("nothing new, nothing fetched", marked == 0 and gmail.calls["messages.get"] == 0, dict(gmail.calls)))
+
+    # The cursor expires: fall back to scanning the threads without a reply.
+    gmail.reply(threads["carol"][1], "carol@leads.example")
+    gmail.expire_history()
+    gmail.calls.clear()
+    marked = sync_replies(db, gmail, ACCOUNT, user.id)
+    checks.append(
+        (
+            "expired history falls back to thread scan",
+            marked == 1 and replied(db) == {"alice@leads.example", "carol@leads.example"},
+            sorted(replied(db)),
+        )
+    )
+    checks.append(
+        (
+            "thread scan skips replied threads",
+            gmail.calls["threads.get"] == 2 and gmail.calls["users.getProfile"] == 1,
+            dict(gmail.calls),
+        )
+    )
+    checkpoint = db.query(MailboxSync.history_id).filter(MailboxSync.account == ACCOUNT).scalar()
+    checks.append(("fresh checkpoint stored", checkpoint == str(gmail.history_id), checkpoint))
+    db.close()
+
+    failed = 0
+    for name, ok, detail in checks:
+        failed += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {name:42s} {detail}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""In-memory stand-in for GmailClient.
+
+Implements the same methods the sender and reply sync use, backed by a local
+mailbox with a monotonically increasing history id. ``calls`` counts API
+requests by Gmail method name so callers can assert on request volume.
+"""
+import itertools
+import time
+from datetime import timezone
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+from app.gmail_client import HistoryExpired
+
+
+class FakeGmail:
+    def __init__(self, account: str = "sender@example.com"):
+        self.account = account
+        self.calls: Counter = Counter()
+        self.history_id = 1
+        self._oldest_history = 1
+        self._ids = itertools.count(1)
+        self._messages: Dict[str, dict] = {}
+        self._threads: Dict[str, List[str]] = defaultdict(list)
+        self._history: List[tuple] = []
+
+    def _add(self, thread_id: str, sender: str, to: str, inbox: bool, internal_date: Optional[int] = None) -> dict:
+        message_id = f"m{next(self._ids)}"
+        message = {
+            "id": message_id,
+            "threadId": thread_id,
+            "from": sender,
+            "to": to,
+            "internal_date": internal_date or int(time.time() * 1000),
+        }
+        self._messages[message_id] = message
+        self._threads[thread_id].append(message_id)
+        self.history_id += 1
+        if inbox:
+            self._history.append((self.history_id, message_id))
+        return message
+
+    def send_message(self, sender, to, subject, body_html, body_text=None, attachments=None):
+        self.calls["messages.send"] += 1
+        thread_id = f"t{next(self._ids)}"
+        message = self._add(thread_id, sender, to, inbox=False)
+        return {"id": message["id"], "threadId": thread_id}
+
+    def reply(self, thread_id: str, sender: str, internal_date: Optional[int] = None) -> dict:
+        return self._add(thread_id, sender, self.account, inbox=True, internal_date=internal_date)
+
+    def expire_history(self):
+        self._oldest_history = self.history_id + 1
+        self._history.clear()
+
+    def thread_has_reply(self, thread_id, lead_email, sent_at) -> bool:
+        self.calls["threads.get"] += 1
+        sent_ms = int(sent_at.replace(tzinfo=timezone.utc).timestamp() * 1000)
+        return any(
+            self._messages[m]["internal_date"] > sent_ms and lead_email.lower() in self._messages[m]["from"].lower()
+            for m in self._threads.get(thread_id, [])
+        )
+
+    def current_history_id(self) -> str:
+        self.calls["users.getProfile"] += 1
+        return str(self.history_id)
+
+    def list_history(self, start_history_id: str):
+        self.calls["history.list"] += 1
+        start = int(start_history_id)
+        if start < self._oldest_history:
+            raise HistoryExpired(start_history_id)
+        added = [
+            {"id": m, "threadId": self._messages[m]["threadId"]} for hid, m in self._history if hid > start
+        ]
+        return added, str(self.history_id)
+
+    def message_senders(self, message_ids: List[str]) -> List[dict]:
+        self.calls["messages.get"] += len(message_ids)
+        return [self._summary(self._messages[m]) for m in message_ids if m in self._messages]
+
+    def thread_senders(self, thread_ids: List[str]) -> List[dict]:
+        self.calls["threads.get"] += len(thread_ids)
+        return [self._summary(self._messages[m]) for t in thread_ids for m in self._threads.get(t, [])]
+
+    @staticmethod
+    def _summary(message: dict) -> dict:
+        return {
+            "id": message["id"],
+            "threadId": message["threadId"],
+            "from": message["from"],
+            "internal_date": message["internal_date"],
+        }
@@ -0,0 +1,102 @@
+"""Runs the benchmark suite and writes a JSON report.
+
+    cd backend
+    python -m benchmarks.run                      # full suite -> benchmarks/results/<commit>.json
+    python -m benchmarks.run --quick              # smaller sizes, for a fast check
+    python -m benchmarks.run --only build_body --only render_email
+    python -m benchmarks.run --compare benchmarks/baseline.json
+
+``--compare`` prints the change of every metric against an earlier report and
+exits non-zero when one regressed by more than ``--threshold`` percent.
+Metrics ending in ``_us`` or ``_s`` are times (lower is better); the rest are
+rates (higher is better).
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import sqlalchemy
+
+from .suite import CASES
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, cwd=os.path.dirname(__file__)
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _lower_is_better(metric: str) -> bool:
+    return metric.endswith(("_us", "_s"))
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> int:
+    regressions = 0
+    for name, metrics in report["results"].items():
+        before = baseline.get("results", {}).get(name, {})
+        for metric, value in metrics.items():
+            old = before.get(metric)
+            if not isinstance(value, (int, float)) or not old:
+                continue
+            change = (value - old) / old * 100
+            worse = change > threshold if _lower_is_better(metric) else change < -threshold
+            regressions += worse
+            flag = "REGRESSION" if worse else ""
+            print(f"{name:18s} {metric:28s} {old:>14} -> {value:>14} ({change:+6.1f}%) {flag}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true")
+    parser.add_argument("--only", action="append", choices=sorted(CASES))
+    parser.add_argument("--output")
+    parser.add_argument("--compare")
+    parser.add_argument("--threshold", type=float, default=20.0)
+    args = parser.parse_args(argv)
+    logging.disable(logging.WARNING)
+
+    report = {
+        "meta": {
+            "commit": _commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "quick": args.quick,
+            "python": platform.python_version(),
+            "sqlalchemy": sqlalchemy.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": {},
+    }
+    for name in args.only or CASES:
+        start = time.perf_counter()
+        report["results"][name] = CASES[name](args.quick)
+        print(f"{name:18s} {time.perf_counter() - start:7.1f}s  {report['results'][name]}", flush=True)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['meta']['commit']}{'-quick' if args.quick else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+"""Benchmark cases for the mailer's hot paths.
+
+Every case builds its own scratch SQLite database (same engine profile as the
+app) and talks to Gmail through ``FakeGmail`` or a stubbed HTTP transport, so
+the suite runs offline. A case returns a flat dict of metrics; ``run.py``
+collects them into a JSON report.
+"""
+import json
+import os
+import secrets
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+import httplib2
+from google.oauth2.credentials import Credentials
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from app.db import Base, build_engine
+from app.gmail_client import GmailClient, ServicePool
+from app.models import Campaign, Lead, ScheduledSend, Settings, User
+from app.services.blocks import render_email
+from app.services.jobs import create_job
+from app.services.lead_import import import_leads
+from app.services.quota import QuotaGovernor
+from app.services.sender import build_body, process_queue, schedule_campaign
+from app.services.templating import lead_values
+
+from .fake_gmail import FakeGmail
+
+CASES: Dict[str, Callable[[bool], dict]] = {}
+
+
+def case(name: str):
+    def register(fn):
+        CASES[name] = fn
+        return fn
+
+    return register
+
+
+@contextmanager
+def scratch_db():
+    directory = tempfile.mkdtemp(prefix="mailer-bench-")
+    engine = build_engine(f"sqlite:///{directory}/bench.db")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, autoflush=False)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def _seed_leads(db, count: int, chunk: int = 20000):
+    for start in range(0, count, chunk):
+        rows = [
+            {
+                "email": f"lead{i}@example.com",
+                "consent": True,
+                "unsubscribed": False,
+                "first_name": f"Lead{i}",
+                "unsubscribe_token": secrets.token_hex(16),
+                "created_at": datetime.utcnow(),
+            }
+            for i in range(start, min(start + chunk, count))
+        ]
+        db.connection().execute(insert(Lead.__table__), rows)
+    db.commit()
+
+
+def _account(db, daily_cap: int = 1_000_000) -> User:
+    user = User(email="sender@example.com", token_encrypted="bench")
+    db.add(user)
+    db.flush()
+    db.add(Settings(user_id=user.id, daily_cap=daily_cap, start_time="00:00", end_time="23:59", timezone="UTC"))
+    db.commit()
+    return user
+
+
+def _campaign(db, user: User) -> Campaign:
+    campaign = Campaign(
+        name="bench",
+        mail1_subject="Hello {{first_name}}",
+        mail1_body="<p>Hi {{first_name|there}}, a short note for {{email}}.</p>" * 20,
+        mail2_subject="Following up",
+        mail2_body="<p>Just checking in, {{first_name}}.</p>",
+        delay_days=3,
+        user_id=user.id,
+    )
+    db.add(campaign)
+    db.commit()
+    return campaign
+
+
+@case("process_queue")
+def bench_process_queue(quick: bool) -> dict:
+    results = {}
+    for depth in (100, 1000) if quick else (100, 1000, 10000):
+        with scratch_db() as db:
+            user = _account(db)
+            campaign = _campaign(db, user)
+            _seed_leads(db, depth)
+            due = datetime.utcnow() - timedelta(minutes=1)
+            db.connection().execute(
+                insert(ScheduledSend.__table__),
+                [
+                    {"lead_id": i, "campaign_id": campaign.id, "user_id": user.id, "step": "mail1", "status": "queued", "scheduled_at": due}
+                    for i in range(1, depth + 1)
+                ],
+            )
+            db.commit()
+            gmail = FakeGmail(user.email)
+            start = time.perf_counter()
+            process_queue(db, user=user, client=gmail)
+            elapsed = time.perf_counter() - start
+            assert gmail.calls["messages.send"] == depth, gmail.calls
+            results[f"depth_{depth}_sends_per_s"] = round(depth / elapsed, 1)
+    return results
+
+
+@case("schedule_campaign")
+def bench_schedule_campaign(quick: bool) -> dict:
+    results = {}
+    for size in (10_000, 100_000) if quick else (10_000, 100_000, 1_000_000):
+        with scratch_db() as db:
+            user = _account(db, daily_cap=200)
+            campaign = _campaign(db, user)
+            _seed_leads(db, size)
+            start = time.perf_counter()
+            schedule_campaign(db, campaign.id)
+            elapsed = time.perf_counter() - start
+            results[f"leads_{size}_s"] = round(elapsed, 3)
+            results[f"leads_{size}_rows_per_s"] = round(size / elapsed, 1)
+    return results
+
+
+@case("lead_import")
+def bench_lead_import(quick: bool) -> dict:
+    rows = 20_000 if quick else 200_000
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    with os.fdopen(fd, "w") as f:
+        f.write("email,consent,first_name,company\n")
+        for i in range(rows):
+            # Every 50th row is invalid so the rejection path is exercised too.
+            email = f"lead{i}@example.com" if i % 50 else "not-an-email"
+            f.write(f"{email},yes,Lead{i},Company {i % 100}\n")
+    with scratch_db() as db:
+        job = create_job(db, "lead_import")
+        start = time.perf_counter()
+        import_leads(db, job, path)  # removes the file
+        elapsed = time.perf_counter() - start
+    return {"rows": rows, "rows_per_s": round(rows / elapsed, 1)}
+
+
+def _per_call_us(fn: Callable, calls: int) -> float:
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        best = min(best, (time.perf_counter() - start) / calls)
+    return round(best * 1e6, 2)
+
+
+class _Lead:
+    email = "ada@example.com"
+    first_name = "Ada"
+    unsubscribe_token = "token"
+    company = "Analytical Engines"
+    country = None
+    custom_fields = {}
+
+
+@case("build_body")
+def bench_build_body(quick: bool) -> dict:
+    lead = _Lead()
+    url = "https://example.com/unsubscribe/token"
+    results = {}
+    for kb in (2, 50) if quick else (2, 50, 500):
+        block = "<tr><td>Hi {{first_name}}, a note for {{company|your team}} ({{email}}). " + "x" * 200 + "</td></tr>"
+        body = block * max(1, kb * 1024 // len(block))
+        results[f"body_{kb}kb_us"] = _per_call_us(
+            lambda: build_body(body, lead, url, (1, "mail1"), lead_values(lead, url)), 200 if kb < 500 else 20
+        )
+    return results
+
+
+def _blocks(count: int) -> List[dict]:
+    kinds = [
+        {"type": "text", "props": {"text": "Hello {{first_name}}, " + "lorem ipsum " * 20}},
+        {"type": "image", "props": {"src": "https://example.com/a.png", "alt": "banner"}},
+        {"type": "button", "props": {"text": "Read more", "url": "https://example.com"}},
+        {"type": "divider", "props": {}},
+        {"type": "spacer", "props": {"height": 16}},
+    ]
+    blocks = [kinds[i % len(kinds)] for i in range(count - 1)]
+    return blocks + [{"type": "signature", "props": {"text": "Unsubscribe: {{unsubscribe_url}}"}}]
+
+
+@case("render_email")
+def bench_render_email(quick: bool) -> dict:
+    styles = {"background": "#ffffff", "padding": 24}
+    return {
+        f"blocks_{count}_us": _per_call_us(lambda: render_email(_blocks(count), styles), 200)
+        for count in ((10, 100) if quick else (10, 100, 500))
+    }
+
+
+class _ThreadHttp:
+    def __init__(self, body: bytes):
+        self.body = body
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        return httplib2.Response({"status": "200"}), self.body
+
+
+def _thread_payload(messages: int) -> bytes:
+    sent_ms = int(time.time() * 1000)
+    return json.dumps(
+        {
+            "id": "t1",
+            "messages": [
+                {
+                    "id": f"m{i}",
+                    "threadId": "t1",
+                    "internalDate": str(sent_ms + i),
+                    "payload": {"headers": [{"name": "From", "value": f"Colleague {i} <c{i}@example.com>"}]},
+                }
+                for i in range(messages)
+            ],
+        }
+    ).encode()
+
+
+@case("thread_has_reply")
+def bench_thread_has_reply(quick: bool) -> dict:
+    results = {}
+    sent_at = datetime.utcnow() - timedelta(days=1)
+    for messages in (10, 100) if quick else (10, 100, 1000):
+        payload = _thread_payload(messages)
+        client = GmailClient(
+            Credentials(token="bench"),
+            account="bench",
+            pool=ServicePool(http_factory=lambda creds: _ThreadHttp(payload)),
+            quota=QuotaGovernor(rate=0),  # measure parsing, not pacing
+        )
+        # No message is from the lead, so every message in the thread is inspected.
+        results[f"messages_{messages}_us"] = _per_call_us(
+            lambda: client.thread_has_reply("t1", "lead@example.com", sent_at), 50
+        )
+    return results
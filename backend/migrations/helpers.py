@@ -0,0 +1,40 @@
+import sqlalchemy as sa
+from alembic import context, op
+
+# Databases created before migrations existed were built with create_all at
+# whatever schema the code had then, so each step only adds what is missing.
+# Offline (--sql) there is nothing to inspect and everything is emitted.
+
+
+def _inspector():
+    return None if context.is_offline_mode() else sa.inspect(op.get_bind())
+
+
+def has_table(table: str) -> bool:
+    inspector = _inspector()
+    return inspector is not None and inspector.has_table(table)
+
+
+def has_column(table: str, column: str) -> bool:
+    inspector = _inspector()
+    return inspector is not None and any(c["name"] == column for c in inspector.get_columns(table))
+
+
+def has_index(table: str, index: str) -> bool:
+    inspector = _inspector()
+    return inspector is not None and any(i["name"] == index for i in inspector.get_indexes(table))
+
+
+def create_index(index: str, table: str, columns, unique: bool = False):
+    if not has_index(table, index):
+        op.create_index(index, table, columns, unique=unique)
+
+
+def add_column(table: str, column: sa.Column):
+    if has_column(table, column.name):
+        return
+    if op.get_context().dialect.name == "sqlite":
+        # Adding a constraint to an existing SQLite table means rebuilding it;
+        # SQLite does not enforce foreign keys by default, so add the bare column.
+        column = sa.Column(column.name, column.type, nullable=column.nullable, server_default=column.server_default)
+    op.add_column(table, column)
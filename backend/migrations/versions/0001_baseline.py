@@ -0,0 +1,141 @@
+"""baseline schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import create_index, has_table
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not has_table("users"):
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("email", sa.String(), nullable=False),
+            sa.Column("token_encrypted", sa.Text(), nullable=False),
+        )
+    create_index("ix_users_id", "users", ["id"])
+    create_index("ix_users_email", "users", ["email"], unique=True)
+
+    if not has_table("leads"):
+        op.create_table(
+            "leads",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("email", sa.String(), nullable=False),
+            sa.Column("consent", sa.Boolean()),
+            sa.Column("unsubscribed", sa.Boolean()),
+            sa.Column("first_name", sa.String()),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("unsubscribe_token", sa.String(), unique=True),
+        )
+    create_index("ix_leads_id", "leads", ["id"])
+    create_index("ix_leads_email", "leads", ["email"], unique=True)
+
+    if not has_table("campaigns"):
+        op.create_table(
+            "campaigns",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("mail1_subject", sa.String(), nullable=False),
+            sa.Column("mail1_body", sa.Text(), nullable=False),
+            sa.Column("mail2_subject", sa.String(), nullable=False),
+            sa.Column("mail2_body", sa.Text(), nullable=False),
+            sa.Column("delay_days", sa.Integer()),
+            sa.Column("paused", sa.Boolean()),
+            sa.Column("created_at", sa.DateTime()),
+        )
+    create_index("ix_campaigns_id", "campaigns", ["id"])
+
+    if not has_table("send_logs"):
+        op.create_table(
+            "send_logs",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("lead_id", sa.Integer(), sa.ForeignKey("leads.id")),
+            sa.Column("campaign_id", sa.Integer(), sa.ForeignKey("campaigns.id")),
+            sa.Column("step", sa.String(), nullable=False),
+            sa.Column("status", sa.String(), nullable=False),
+            sa.Column("scheduled_at", sa.DateTime()),
+            sa.Column("sent_at", sa.DateTime()),
+            sa.Column("message_id", sa.String()),
+            sa.Column("thread_id", sa.String()),
+            sa.Column("error", sa.Text()),
+        )
+    create_index("ix_send_logs_id", "send_logs", ["id"])
+
+    if not has_table("settings"):
+        op.create_table(
+            "settings",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("start_time", sa.String()),
+            sa.Column("end_time", sa.String()),
+            sa.Column("interval_min", sa.Integer()),
+            sa.Column("interval_max", sa.Integer()),
+            sa.Column("daily_cap", sa.Integer()),
+            sa.Column("timezone", sa.String()),
+        )
+    create_index("ix_settings_id", "settings", ["id"])
+
+    if not has_table("scheduled_sends"):
+        op.create_table(
+            "scheduled_sends",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("lead_id", sa.Integer(), sa.ForeignKey("leads.id")),
+            sa.Column("campaign_id", sa.Integer(), sa.ForeignKey("campaigns.id")),
+            sa.Column("step", sa.String(), nullable=False),
+            sa.Column("scheduled_at", sa.DateTime(), nullable=False),
+            sa.Column("status", sa.String()),
+        )
+    create_index("ix_scheduled_sends_id", "scheduled_sends", ["id"])
+
+    if not has_table("email_templates"):
+        op.create_table(
+            "email_templates",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("blocks_json", sa.Text(), nullable=False),
+            sa.Column("html_body", sa.Text(), nullable=False),
+            sa.Column("text_body", sa.Text(), nullable=False),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("updated_at", sa.DateTime()),
+        )
+    create_index("ix_email_templates_id", "email_templates", ["id"])
+
+    if not has_table("template_attachments"):
+        op.create_table(
+            "template_attachments",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("template_id", sa.Integer(), sa.ForeignKey("email_templates.id")),
+            sa.Column("filename", sa.String(), nullable=False),
+            sa.Column("url", sa.String(), nullable=False),
+            sa.Column("size", sa.Integer()),
+        )
+    create_index("ix_template_attachments_id", "template_attachments", ["id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in (
+        "template_attachments",
+        "email_templates",
+        "scheduled_sends",
+        "settings",
+        "send_logs",
+        "campaigns",
+        "leads",
+        "users",
+    ):
+        op.drop_table(table)
@@ -0,0 +1,139 @@
+"""accounts, queue leases, reply sync, jobs, custom fields and campaign stats
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import add_column, create_index, has_table
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+NEW_COLUMNS = [
+    ("leads", lambda: sa.Column("custom_fields", sa.JSON())),
+    (
+        "campaigns",
+        lambda: sa.Column(
+            "user_id", sa.Integer(), sa.ForeignKey("users.id", name="fk_campaigns_user_id", ondelete="SET NULL")
+        ),
+    ),
+    (
+        "send_logs",
+        lambda: sa.Column(
+            "user_id", sa.Integer(), sa.ForeignKey("users.id", name="fk_send_logs_user_id", ondelete="SET NULL")
+        ),
+    ),
+    (
+        "settings",
+        lambda: sa.Column(
+            "user_id", sa.Integer(), sa.ForeignKey("users.id", name="fk_settings_user_id", ondelete="CASCADE")
+        ),
+    ),
+    (
+        "scheduled_sends",
+        lambda: sa.Column(
+            "user_id", sa.Integer(), sa.ForeignKey("users.id", name="fk_scheduled_sends_user_id", ondelete="SET NULL")
+        ),
+    ),
+    ("scheduled_sends", lambda: sa.Column("lease_owner", sa.String())),
+    ("scheduled_sends", lambda: sa.Column("lease_expires_at", sa.DateTime())),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table, column in NEW_COLUMNS:
+        add_column(table, column())
+    create_index("ix_settings_user_id", "settings", ["user_id"], unique=True)
+
+    if not has_table("replies"):
+        op.create_table(
+            "replies",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("lead_id", sa.Integer(), sa.ForeignKey("leads.id"), nullable=False),
+            sa.Column("campaign_id", sa.Integer(), sa.ForeignKey("campaigns.id"), nullable=False),
+            sa.Column("thread_id", sa.String()),
+            sa.Column("message_id", sa.String()),
+            sa.Column("detected_at", sa.DateTime()),
+            sa.UniqueConstraint("lead_id", "campaign_id", name="uq_replies_lead_campaign"),
+        )
+    create_index("ix_replies_id", "replies", ["id"])
+
+    if not has_table("mailbox_sync"):
+        op.create_table(
+            "mailbox_sync",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("account", sa.String(), nullable=False),
+            sa.Column("history_id", sa.String()),
+            sa.Column("synced_at", sa.DateTime()),
+        )
+    create_index("ix_mailbox_sync_id", "mailbox_sync", ["id"])
+    create_index("ix_mailbox_sync_account", "mailbox_sync", ["account"], unique=True)
+
+    if not has_table("jobs"):
+        op.create_table(
+            "jobs",
+            sa.Column("id", sa.String(), primary_key=True),
+            sa.Column("kind", sa.String(), nullable=False),
+            sa.Column("status", sa.String()),
+            sa.Column("total", sa.Integer()),
+            sa.Column("processed", sa.Integer()),
+            sa.Column("rejected", sa.Integer()),
+            sa.Column("error", sa.Text()),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("finished_at", sa.DateTime()),
+        )
+
+    if not has_table("job_rejections"):
+        op.create_table(
+            "job_rejections",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("job_id", sa.String(), sa.ForeignKey("jobs.id"), nullable=False),
+            sa.Column("row_number", sa.Integer(), nullable=False),
+            sa.Column("reason", sa.String(), nullable=False),
+            sa.Column("value", sa.Text()),
+        )
+    create_index("ix_job_rejections_id", "job_rejections", ["id"])
+    create_index("ix_job_rejections_job_id", "job_rejections", ["job_id"])
+
+    if not has_table("campaign_stats"):
+        op.create_table(
+            "campaign_stats",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("campaign_id", sa.Integer(), sa.ForeignKey("campaigns.id"), nullable=False),
+            sa.Column("step", sa.String(), nullable=False),
+            sa.Column("status", sa.String(), nullable=False),
+            sa.Column("count", sa.Integer(), nullable=False),
+            sa.UniqueConstraint("campaign_id", "step", "status", name="uq_campaign_stats_key"),
+        )
+    create_index("ix_campaign_stats_id", "campaign_stats", ["id"])
+
+    if not has_table("campaign_daily_stats"):
+        op.create_table(
+            "campaign_daily_stats",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("campaign_id", sa.Integer(), sa.ForeignKey("campaigns.id"), nullable=False),
+            sa.Column("day", sa.Date(), nullable=False),
+            sa.Column("sent", sa.Integer(), nullable=False),
+            sa.UniqueConstraint("campaign_id", "day", name="uq_campaign_daily_stats_key"),
+        )
+    create_index("ix_campaign_daily_stats_id", "campaign_daily_stats", ["id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in ("campaign_daily_stats", "campaign_stats", "job_rejections", "jobs", "mailbox_sync", "replies"):
+        op.drop_table(table)
+    op.drop_index("ix_settings_user_id", table_name="settings")
+    for table, column in reversed(NEW_COLUMNS):
+        with op.batch_alter_table(table) as batch:
+            batch.drop_column(column().name)
@@ -0,0 +1,41 @@
+"""composite indexes for the queue, mail2 lookup and log paging
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from migrations.helpers import create_index
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    # claim_due / process_queue: status = 'queued' AND scheduled_at <= now, ordered by scheduled_at
+    ("ix_scheduled_sends_status_scheduled_at", "scheduled_sends", ["status", "scheduled_at"]),
+    # GET /queue keyset pages on (scheduled_at, id)
+    ("ix_scheduled_sends_scheduled_at_id", "scheduled_sends", ["scheduled_at", "id"]),
+    # _previous_mail1: the mail1 log a follow-up threads onto
+    ("ix_send_logs_lead_campaign_step_status_sent_at", "send_logs", ["lead_id", "campaign_id", "step", "status", "sent_at"]),
+    # GET /logs?campaign_id= keyset pages on id
+    ("ix_send_logs_campaign_id_id", "send_logs", ["campaign_id", "id"]),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for name, table, columns in INDEXES:
+        create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
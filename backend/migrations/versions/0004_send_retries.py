@@ -0,0 +1,37 @@
+"""attempt tracking for queued sends
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import add_column
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, Sequence[str], None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+NEW_COLUMNS = [
+    ("scheduled_sends", lambda: sa.Column("attempts", sa.Integer(), nullable=False, server_default="0")),
+    ("scheduled_sends", lambda: sa.Column("last_error", sa.Text())),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table, column in NEW_COLUMNS:
+        add_column(table, column())
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, column in reversed(NEW_COLUMNS):
+        with op.batch_alter_table(table) as batch:
+            batch.drop_column(column().name)
@@ -0,0 +1,67 @@
+"""audience segments and promoted lead columns
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import add_column, create_index, has_table
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, Sequence[str], None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PROMOTED = ("company", "country")
+NEW_COLUMNS = [
+    ("leads", lambda: sa.Column("company", sa.String())),
+    ("leads", lambda: sa.Column("country", sa.String())),
+    (
+        "campaigns",
+        lambda: sa.Column("segment_id", sa.Integer(), sa.ForeignKey("segments.id", name="fk_campaigns_segment_id")),
+    ),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not has_table("segments"):
+        op.create_table(
+            "segments",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("rules", sa.JSON(), nullable=False),
+            sa.Column("lead_count", sa.Integer()),
+            sa.Column("counted_at", sa.DateTime()),
+            sa.Column("revision", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("created_at", sa.DateTime()),
+        )
+    create_index("ix_segments_id", "segments", ["id"])
+    for table, column in NEW_COLUMNS:
+        add_column(table, column())
+
+    # Imports so far kept company and country among the custom fields.
+    leads = sa.table("leads", sa.column("custom_fields", sa.JSON()), *(sa.column(name, sa.String()) for name in PROMOTED))
+    for name in PROMOTED:
+        op.execute(
+            leads.update()
+            .where(leads.c[name].is_(None), leads.c.custom_fields.isnot(None))
+            .values({name: leads.c.custom_fields[name].as_string()})
+        )
+        create_index(f"ix_leads_{name}", "leads", [name])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in reversed(PROMOTED):
+        op.drop_index(f"ix_leads_{name}", table_name="leads")
+    for table, column in reversed(NEW_COLUMNS):
+        with op.batch_alter_table(table) as batch:
+            batch.drop_column(column().name)
+    op.drop_table("segments")
@@ -0,0 +1,37 @@
+"""campaign priority and fair-share weight
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import add_column
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, Sequence[str], None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+NEW_COLUMNS = [
+    ("campaigns", lambda: sa.Column("priority", sa.Integer(), nullable=False, server_default="0")),
+    ("campaigns", lambda: sa.Column("weight", sa.Integer(), nullable=False, server_default="1")),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table, column in NEW_COLUMNS:
+        add_column(table, column())
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, column in reversed(NEW_COLUMNS):
+        with op.batch_alter_table(table) as batch:
+            batch.drop_column(column().name)
@@ -0,0 +1,39 @@
+"""per-account settings become opt-in overrides
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: Union[str, Sequence[str], None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FIELDS = ("start_time", "end_time", "interval_min", "interval_max", "daily_cap", "timezone")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Accounts used to get a copy of the defaults on first use. Copies nobody
+    # changed are dropped so those accounts follow the defaults row again.
+    settings = sa.table("settings", sa.column("id", sa.Integer()), sa.column("user_id", sa.Integer()), *(sa.column(f) for f in FIELDS))
+    defaults = settings.alias("defaults")
+    unchanged = (
+        sa.select(defaults.c.id)
+        .where(defaults.c.user_id.is_(None), *(defaults.c[f] == settings.c[f] for f in FIELDS))
+        .exists()
+    )
+    op.execute(settings.delete().where(settings.c.user_id.isnot(None), unchanged))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Accounts without a row read the defaults, which is what the copies held.
+    pass
@@ -19,8 +19,13 @@ const inputPill = (active: boolean) =>
 
 export default function LeadsPage() {
   const [leads, setLeads] = useState<Lead[]>([]);
+  const [cursor, setCursor] = useState<string | null>(null);
 
-  const load = () => apiGet('/leads').then(setLeads);
+  const load = async (after?: string | null) => {
+    const page = await apiGet(after ? `/leads?cursor=${encodeURIComponent(after)}` : '/leads');
+    setLeads((prev) => (after ? [...prev, ...page.items] : page.items));
+    setCursor(page.next_cursor);
+  };
 
   useEffect(() => {
     load();
@@ -29,13 +34,17 @@ export default function LeadsPage() {
   const onUpload = async (event: React.ChangeEvent<HTMLInputElement>) => {
     const file = event.target.files?.[0];
     if (!file) return;
-    await apiUpload('/leads/upload', file);
+    let job = await apiUpload('/leads/upload', file);
+    while (job.id && (job.status === 'queued' || job.status === 'running')) {
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+      job = await apiGet(`/jobs/${job.id}`);
+    }
     load();
   };
 
   const toggleConsent = async (lead: Lead) => {
     await apiPost(`/leads/${lead.id}/consent?consent=${!lead.consent}`);
-    load();
+    setLeads((prev) => prev.map((l) => (l.id === lead.id ? { ...l, consent: !lead.consent } : l)));
   };
 
   return (
@@ -85,6 +94,11 @@ export default function LeadsPage() {
             </tbody>
           </table>
         </div>
+        {cursor && (
+          <button onClick={() => load(cursor)} className="rounded-lg border border-[#1f2937] px-4 py-2 text-sm font-semibold text-[#e5e7eb] hover:bg-[#111827]">
+            Load more
+          </button>
+        )}
         <p className="text-xs text-[#9ca3af]">
           Consent is required to send; suppression is automatic via unsubscribe tokens embedded in every email footer.
         </p>
@@ -26,9 +26,16 @@ const statusColor: Record<string, string> = {
 
 export default function LogsPage() {
   const [logs, setLogs] = useState<Log[]>([]);
+  const [cursor, setCursor] = useState<string | null>(null);
+
+  const load = async (after?: string | null) => {
+    const page = await apiGet(after ? `/logs?cursor=${encodeURIComponent(after)}` : '/logs');
+    setLogs((prev) => (after ? [...prev, ...page.items] : page.items));
+    setCursor(page.next_cursor);
+  };
 
   useEffect(() => {
-    apiGet('/logs').then(setLogs);
+    load();
   }, []);
 
   return (
@@ -83,6 +90,11 @@ export default function LogsPage() {
             </motion.div>
           ))}
         </div>
+        {cursor && (
+          <button onClick={() => load(cursor)} className="rounded-lg border border-[#1f2937] px-4 py-2 text-sm font-semibold text-[#e5e7eb] hover:bg-[#111827]">
+            Load older
+          </button>
+        )}
       </div>
     </SurfaceCard>
   );
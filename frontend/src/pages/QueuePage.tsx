@@ -15,9 +15,16 @@ type QueueItem = {
 
 export default function QueuePage() {
   const [items, setItems] = useState<QueueItem[]>([]);
+  const [cursor, setCursor] = useState<string | null>(null);
+
+  const load = async (after?: string | null) => {
+    const page = await apiGet(after ? `/queue?cursor=${encodeURIComponent(after)}` : '/queue');
+    setItems((prev) => (after ? [...prev, ...page.items] : page.items));
+    setCursor(page.next_cursor);
+  };
 
   useEffect(() => {
-    apiGet('/queue').then(setItems);
+    load();
   }, []);
 
   return (
@@ -59,6 +66,11 @@ export default function QueuePage() {
             </motion.div>
           ))}
         </div>
+        {cursor && (
+          <button onClick={() => load(cursor)} className="rounded-lg border border-[#1f2937] px-4 py-2 text-sm font-semibold text-[#e5e7eb] hover:bg-[#111827]">
+            Load more
+          </button>
+        )}
       </div>
     </SurfaceCard>
   );